@@ -1,20 +1,53 @@
 from flask import Flask, render_template
-from flask_wtf.csrf import CSRFProtect
-from flask_login import LoginManager, login_required
 import os
-from config import Config
+from config import Config, _get_secret_key
 from models import db
 
-# Import blueprints
-from routes.main import main_bp
-from routes.transactions import transactions_bp
-from routes.reports import reports_bp
-from routes.settings import settings_bp
-from routes.auth import auth_bp
+# Security headers added to every response, built once at import
+SECURITY_HEADERS = (
+    ('X-Content-Type-Options', 'nosniff'),
+    ('X-Frame-Options', 'DENY'),
+    ('X-XSS-Protection', '1; mode=block'),
+    ('Referrer-Policy', 'strict-origin-when-cross-origin'),
+    ('Content-Security-Policy', (
+        "default-src 'self'; "
+        "script-src 'self' 'unsafe-inline' cdn.jsdelivr.net; "
+        "style-src 'self' 'unsafe-inline' cdn.jsdelivr.net; "
+        "img-src 'self' data:; "
+        "font-src 'self' cdn.jsdelivr.net; "
+        "connect-src 'self'; "
+        "frame-ancestors 'none';"
+    )),
+)
+
+def _ensure_dir(path):
+    """Create a directory with a single mkdir, tolerating one that already exists"""
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        pass
+    except FileNotFoundError:
+        # Parent is missing too - fall back to creating the whole path
+        os.makedirs(path, exist_ok=True)
+
+def init_db(app):
+    """Create any database tables that don't exist yet and upgrade ones created by older versions"""
+    from models.schema import upgrade_schema
+    
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
 
 def create_app():
+    # Extensions are imported here so `from app import Config` stays cheap
+    from flask_wtf.csrf import CSRFProtect
+    from flask_login import LoginManager
+    
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.config.from_mapping(SECRET_KEY=_get_secret_key(app.instance_path))
+    # API responses don't need sorted keys; skip the sort on every jsonify
+    app.json.sort_keys = False
     
     # Initialize CSRF protection
     csrf = CSRFProtect(app)
@@ -22,6 +55,10 @@ def create_app():
     # Initialize database
     db.init_app(app)
     
+    # Per-user dashboard stats cache
+    from utils import dashboard_cache
+    dashboard_cache.init_app(app)
+    
     # Initialize Flask-Login
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -32,9 +69,20 @@ def create_app():
     @login_manager.user_loader
     def load_user(user_id):
         from models import User
-        return User.query.get(int(user_id))
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None  # Tampered or empty session data
+        # Flask-Login can ask for the user several times per request
+        return User.get_by_id(user_id)
+    
+    # Register blueprints (imported here so `from app import Config` stays cheap)
+    from routes.main import main_bp
+    from routes.transactions import transactions_bp
+    from routes.reports import reports_bp
+    from routes.settings import settings_bp
+    from routes.auth import auth_bp
     
-    # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(transactions_bp)
@@ -43,33 +91,13 @@ def create_app():
     
     # Create upload directories
     upload_dir = os.path.join(os.getcwd(), app.config['UPLOAD_FOLDER'])
-    os.makedirs(upload_dir, exist_ok=True)
-    os.makedirs(os.path.join(upload_dir, 'pdfs'), exist_ok=True)
-    
-    # Add config helper to templates
-    app.config['allowed_file'] = Config.allowed_file
+    _ensure_dir(upload_dir)
+    _ensure_dir(os.path.join(upload_dir, 'pdfs'))
     
     # Security headers
     @app.after_request
     def after_request(response):
-        # Security headers
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'DENY'
-        response.headers['X-XSS-Protection'] = '1; mode=block'
-        response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
-        
-        # Content Security Policy
-        csp_policy = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline' cdn.jsdelivr.net; "
-            "style-src 'self' 'unsafe-inline' cdn.jsdelivr.net; "
-            "img-src 'self' data:; "
-            "font-src 'self' cdn.jsdelivr.net; "
-            "connect-src 'self'; "
-            "frame-ancestors 'none';"
-        )
-        response.headers['Content-Security-Policy'] = csp_policy
-        
+        response.headers.update(SECURITY_HEADERS)
         return response
     
     # Error handlers
@@ -88,14 +116,22 @@ def create_app():
         return render_template('error.html', 
                              message='Internal server error occurred.'), 500
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # Schema creation reflects every table, so production runs `flask init-db`
+    # once per deploy instead of paying for it in every worker
+    if os.environ.get('IBEEKEEPER_INIT_DB') == '1':
+        init_db(app)
+    
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create database tables"""
+        init_db(app)
+        print('Database tables created')
     
     return app
 
 if __name__ == '__main__':
     app = create_app()
+    init_db(app)
     
     # Run with debug mode for development
     port = int(os.environ.get('PORT', 5000))
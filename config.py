@@ -1,12 +1,37 @@
 import os
 import secrets
-from dotenv import load_dotenv
 
-load_dotenv()
+# Production platforms inject the environment directly, so skip both the
+# dotenv import and its search for a .env file there
+if os.environ.get('FLASK_ENV') != 'production' and not os.environ.get('IBEEKEEPER_SKIP_DOTENV'):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+SECRET_KEY_FILE = '.flask_secret_key'
+
+def _get_secret_key(instance_path):
+    """Get the secret key from the environment, or a per-instance key file in development"""
+    key = os.environ.get('SECRET_KEY')
+    if key:
+        return key
+    if os.environ.get('FLASK_ENV') == 'production':
+        raise RuntimeError('SECRET_KEY must be set in production')
+    
+    # Share one generated key between workers and restarts so sessions survive
+    key_path = os.path.join(instance_path, SECRET_KEY_FILE)
+    os.makedirs(instance_path, exist_ok=True)
+    try:
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(key_path) as f:
+            return f.read().strip()
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, 'w') as f:
+        f.write(key)
+    return key
 
 class Config:
-    # Flask configuration - Generate secure secret key if not provided
-    SECRET_KEY = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
+    # Flask configuration - SECRET_KEY is resolved in create_app via _get_secret_key
     
     # Security configuration
     SESSION_COOKIE_SECURE = os.environ.get('FLASK_ENV') == 'production'
@@ -30,19 +55,36 @@ class Config:
     SQLALCHEMY_DATABASE_URI = database_url
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Connection pool tuning for server databases. SQLite keeps SQLAlchemy's
+    # default pool, which doesn't accept these options.
+    if database_url.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+    else:
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': 30,
+            'pool_recycle': 1800,  # Recycle before server-side idle timeouts
+            'pool_pre_ping': True,
+            'pool_use_lifo': True  # Reuse hot connections so idle overflow ages out
+        }
+    
     # File upload configuration
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    ALLOWED_EXTENSIONS = {'pdf'}
+    ALLOWED_EXTENSIONS = frozenset({'pdf'})
     
     # Wise API configuration (dummy for now)
     WISE_API_URL = os.environ.get('WISE_API_URL') or 'https://api.dummy-wise.com'
     WISE_API_TOKEN = os.environ.get('WISE_API_TOKEN') or 'dummy-token'
     
+    # Seconds a user's dashboard stats are reused; writes invalidate them sooner
+    DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', 60))
+    
     # App settings
     CATEGORIES = ['Revenue', 'Expense']
     
     @staticmethod
     def allowed_file(filename):
-        return '.' in filename and \
-               filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
\ No newline at end of file
+        dot = filename.rfind('.')
+        return dot >= 0 and filename[dot + 1:].lower() in Config.ALLOWED_EXTENSIONS
\ No newline at end of file
@@ -41,21 +41,17 @@ def migrate_existing_data_to_admin(admin_user):
     """Assign all existing data to the admin user"""
     print("Migrating existing data to admin user...")
     
-    # Update all existing transactions
-    transactions_updated = Transaction.query.update({'user_id': admin_user.id})
-    print(f"   ✅ Updated {transactions_updated} transactions")
-    
-    # Update all existing transaction codes
-    codes_updated = TransactionCode.query.update({'user_id': admin_user.id})
-    print(f"   ✅ Updated {codes_updated} transaction codes")
-    
-    # Update all existing documents
-    documents_updated = Document.query.update({'user_id': admin_user.id})
-    print(f"   ✅ Updated {documents_updated} documents")
-    
-    # Update all existing app settings
-    settings_updated = AppSettings.query.update({'user_id': admin_user.id})
-    print(f"   ✅ Updated {settings_updated} app settings")
+    # All four UPDATEs run in one transaction and are committed once below.
+    # Nothing is loaded in the session yet, so skip synchronizing it.
+    models_to_update = [
+        (Transaction, 'transactions'),
+        (TransactionCode, 'transaction codes'),
+        (Document, 'documents'),
+        (AppSettings, 'app settings')
+    ]
+    for model, label in models_to_update:
+        updated = model.query.update({'user_id': admin_user.id}, synchronize_session=False)
+        print(f"   ✅ Updated {updated} {label}")
     
     db.session.commit()
 
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Index migration for existing databases
+Brings indexes created by older versions in line with the models using raw SQL
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3
+
+def get_db_path():
+    """Get the database path"""
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'database.db')
+
+def run_migration():
+    """Run the index migration using raw SQL"""
+    db_path = get_db_path()
+
+    if not os.path.exists(db_path):
+        print("❌ Database file not found. Please run the Flask app once to create the database.")
+        return
+
+    print("🚀 Starting index migration...")
+    print("=" * 50)
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        # Step 1: Composite (user_id, setting_key) index on app_settings
+        print("1. Creating composite app_settings index...")
+
+        # Older versions allowed duplicate keys per user; keep the first row,
+        # which is the one the settings getters and setters already used
+        cursor.execute('''
+        DELETE FROM app_settings
+        WHERE user_id IS NOT NULL AND id NOT IN (
+            SELECT MIN(id) FROM app_settings
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id, setting_key
+        )
+        ''')
+        if cursor.rowcount:
+            print(f"   ✅ Removed {cursor.rowcount} duplicate app settings")
+
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS ix_app_settings_user_key ON app_settings (user_id, setting_key)')
+        cursor.execute('DROP INDEX IF EXISTS ix_app_settings_setting_key')
+        print("   ✅ ix_app_settings_user_key created, ix_app_settings_setting_key dropped")
+
+        # Step 2: Single-column transaction indexes covered by composites
+        print("2. Dropping redundant transaction indexes...")
+        for index_name in ['ix_transaction_date', 'ix_transaction_currency', 'ix_transaction_status']:
+            cursor.execute(f'DROP INDEX IF EXISTS {index_name}')
+        print("   ✅ date, currency and status are served by the composite indexes")
+
+        # Step 3: One code per transaction
+        print("3. Making transaction_code.transaction_id unique...")
+        cursor.execute('''
+        DELETE FROM transaction_code
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM transaction_code GROUP BY transaction_id
+        )
+        ''')
+        if cursor.rowcount:
+            print(f"   ✅ Removed {cursor.rowcount} duplicate transaction codes")
+
+        cursor.execute('DROP INDEX IF EXISTS ix_transaction_code_transaction_id')
+        cursor.execute('CREATE UNIQUE INDEX ix_transaction_code_transaction_id ON transaction_code (transaction_id)')
+        print("   ✅ ix_transaction_code_transaction_id is now unique")
+
+        # Step 4: Login lookup index
+        print("4. Creating login lookup index...")
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_email_active_covering ON users (email, is_active)')
+        print("   ✅ idx_users_email_active_covering created")
+
+        # Step 5: Per-user date index
+        print("5. Creating per-user date index on transactions...")
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transaction_user_date ON "transaction" (user_id, date)')
+        cursor.execute('DROP INDEX IF EXISTS ix_transaction_user_id')
+        print("   ✅ idx_transaction_user_date created, ix_transaction_user_id dropped")
+
+        # Step 6: Commit changes
+        conn.commit()
+
+        print("\n" + "=" * 50)
+        print("✅ Index migration completed successfully!")
+
+    except Exception as e:
+        print(f"\n❌ Migration failed: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    print("⚠️  WARNING: This will modify your database structure!")
+    print("   Make sure you have a backup before proceeding.")
+    print("\nRunning migration...")
+    run_migration()
@@ -8,6 +8,8 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import errno
+import shutil
 import sqlite3
 from werkzeug.security import generate_password_hash
 import secrets
@@ -16,6 +18,23 @@ def get_db_path():
     """Get the database path"""
     return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'database.db')
 
+def iter_upload_files(upload_path):
+    """Yield the files directly inside the upload folder (subfolders such as users/ are skipped)"""
+    with os.scandir(upload_path) as entries:
+        for entry in entries:
+            # Uses the type scandir already read, no extra stat per file
+            if entry.is_file(follow_symlinks=False):
+                yield entry.path
+
+def move_file(src, dst):
+    """Move a file with a plain rename, copying only across filesystems"""
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dst)
+
 def run_migration():
     """Run the complete migration using raw SQL"""
     db_path = get_db_path()
@@ -126,51 +145,38 @@ def run_migration():
             if transaction_count > 0:
                 print("4. Migrating existing data to admin user...")
                 
-                # Update existing transactions
-                cursor.execute('UPDATE "transaction" SET user_id = ? WHERE user_id IS NULL', (admin_user_id,))
-                transactions_updated = cursor.rowcount
-                print(f"   ✅ Updated {transactions_updated} transactions")
-                
-                # Update existing transaction codes
-                cursor.execute('UPDATE transaction_code SET user_id = ? WHERE user_id IS NULL', (admin_user_id,))
-                codes_updated = cursor.rowcount
-                print(f"   ✅ Updated {codes_updated} transaction codes")
-                
-                # Update existing documents
-                cursor.execute('UPDATE document SET user_id = ? WHERE user_id IS NULL', (admin_user_id,))
-                documents_updated = cursor.rowcount
-                print(f"   ✅ Updated {documents_updated} documents")
-                
-                # Update existing app settings
-                cursor.execute('UPDATE app_settings SET user_id = ? WHERE user_id IS NULL', (admin_user_id,))
-                settings_updated = cursor.rowcount
-                print(f"   ✅ Updated {settings_updated} app settings")
+                # These UPDATEs share the transaction opened by the admin INSERT above
+                # and are committed together in step 4. The ix_<table>_user_id indexes
+                # created in step 2 serve the IS NULL lookups.
+                tables_to_update = [
+                    ('"transaction"', 'transactions'),
+                    ('transaction_code', 'transaction codes'),
+                    ('document', 'documents'),
+                    ('app_settings', 'app settings')
+                ]
+                for table_name, label in tables_to_update:
+                    cursor.execute(f'UPDATE {table_name} SET user_id = ? WHERE user_id IS NULL', (admin_user_id,))
+                    print(f"   ✅ Updated {cursor.rowcount} {label}")
                 
                 print("5. Migrating file structure...")
-                # Create user-specific upload directory
+                # Create user-specific upload directory (the folder name is freshly
+                # generated, so it cannot exist yet)
                 user_upload_path = f"uploads/users/{user_folder}"
-                os.makedirs(user_upload_path, exist_ok=True)
+                os.makedirs(user_upload_path)
                 
                 # Move existing files if they exist
                 old_upload_path = "uploads"
                 if os.path.exists(old_upload_path) and os.path.isdir(old_upload_path):
-                    # Check if there are files to move
-                    files_to_move = []
-                    for root, dirs, files in os.walk(old_upload_path):
-                        if root != old_upload_path or 'users' in dirs:
-                            continue  # Skip the users subfolder
-                        files_to_move.extend([os.path.join(root, f) for f in files])
+                    moved = 0
+                    for file_path in iter_upload_files(old_upload_path):
+                        try:
+                            move_file(file_path, os.path.join(user_upload_path, os.path.basename(file_path)))
+                            moved += 1
+                        except OSError as e:
+                            print(f"      Warning: Could not move {file_path}: {e}")
                     
-                    if files_to_move:
-                        import shutil
-                        for file_path in files_to_move:
-                            try:
-                                filename = os.path.basename(file_path)
-                                new_path = os.path.join(user_upload_path, filename)
-                                shutil.move(file_path, new_path)
-                            except Exception as e:
-                                print(f"      Warning: Could not move {file_path}: {e}")
-                        print(f"   ✅ Moved {len(files_to_move)} files to user directory")
+                    if moved:
+                        print(f"   ✅ Moved {moved} files to user directory")
                     else:
                         print("   ✅ No files to migrate")
                 else:
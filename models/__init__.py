@@ -1,9 +1,25 @@
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 db = SQLAlchemy()
 
+@event.listens_for(Engine, 'connect')
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL with NORMAL sync on SQLite: one fsync per checkpoint instead of two per commit"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA mmap_size=268435456')  # 256MB
+    cursor.close()
+
 from .user import User
 from .transaction import Transaction
 from .document import Document
 from .transaction_code import TransactionCode
-from .app_settings import AppSettings
\ No newline at end of file
+from .app_settings import AppSettings
+from .background_job import BackgroundJob
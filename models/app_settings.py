@@ -1,37 +1,100 @@
+from flask import g, has_app_context
 from models import db
-from sqlalchemy.orm import validates
+from sqlalchemy.orm import validates, reconstructor
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
 import json
 
+# Cache marker for a lookup that hasn't been made yet (None means no such setting)
+_MISSING = object()
+
+# Dialects whose INSERT supports ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert
+}
+
+# Setting keys, stored already normalized
+WISE_API_URL = 'WISE_API_URL'
+WISE_API_TOKEN = 'WISE_API_TOKEN'
+WISE_ENTITY_NUMBER = 'WISE_ENTITY_NUMBER'
+WISE_SANDBOX_MODE = 'WISE_SANDBOX_MODE'
+KNOWN_KEYS = frozenset({WISE_API_URL, WISE_API_TOKEN, WISE_ENTITY_NUMBER, WISE_SANDBOX_MODE})
+
+# Wise API setting keys and the defaults used when a key isn't stored
+WISE_CONFIG_KEYS = {
+    'api_url': (WISE_API_URL, 'https://api.wise.com'),
+    'api_token': (WISE_API_TOKEN, ''),
+    'entity_number': (WISE_ENTITY_NUMBER, ''),
+    'is_sandbox': (WISE_SANDBOX_MODE, False)
+}
+
 class AppSettings(db.Model):
     __tablename__ = 'app_settings'
+    __table_args__ = (
+        # Every per-user lookup filters on both columns; the unique index also
+        # serves as the conflict target for upserts
+        db.Index('ix_app_settings_user_key', 'user_id', 'setting_key', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)  # Nullable for migration
-    setting_key = db.Column(db.String(100), nullable=False, index=True)  # Removed unique constraint
+    setting_key = db.Column(db.String(100), nullable=False)  # Unique per user via ix_app_settings_user_key
     setting_value = db.Column(db.Text, nullable=True)  # Store as JSON string for complex values
     is_encrypted = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     
+    user = db.relationship('User', back_populates='app_settings')
+    
     @validates('setting_key')
     def validate_setting_key(self, key, value):
         """Validate setting key format"""
-        if not value or len(value.strip()) == 0:
+        key = AppSettings._normalize_key(value) if value else value
+        if not key:
             raise ValueError("Setting key cannot be empty")
-        return value.strip().upper()
+        return key
+    
+    @staticmethod
+    def _normalize_key(key):
+        """Strip and uppercase a key, skipping the work for keys already in stored form"""
+        if key in KNOWN_KEYS:
+            return key
+        if key.isupper() and not key[0].isspace() and not key[-1].isspace():
+            return key
+        return key.strip().upper()
+    
+    @reconstructor
+    def init_on_load(self):
+        """Reset the parsed value cache when the row is loaded from the database"""
+        self._parsed = None
+    
+    @staticmethod
+    def _serialize(value):
+        """Convert a value to its stored string form"""
+        if isinstance(value, (dict, list, bool)) or value is None:
+            return json.dumps(value)
+        return str(value)
     
     def set_value(self, value):
         """Set setting value, converting to JSON if needed"""
-        if isinstance(value, (dict, list, bool)) or value is None:
-            self.setting_value = json.dumps(value)
-        else:
-            self.setting_value = str(value)
+        self.setting_value = AppSettings._serialize(value)
+        self._parsed = None
     
     def get_value(self, default=None):
-        """Get setting value, parsing JSON if needed"""
+        """Get setting value, parsing JSON if needed (parsed once per instance)"""
         if self.setting_value is None:
             return default
         
+        # Cache is keyed on the raw string, so a refresh from the database
+        # that replaces setting_value also invalidates it
+        parsed = getattr(self, '_parsed', None)
+        if parsed is None or parsed[0] is not self.setting_value:
+            parsed = self._parsed = (self.setting_value, self._parse())
+        return parsed[1]
+    
+    def _parse(self):
+        """Parse the stored string into its Python value"""
         # Try to parse as JSON first
         try:
             return json.loads(self.setting_value)
@@ -47,62 +110,157 @@ class AppSettings(db.Model):
     @staticmethod
     def get_setting(key, default=None):
         """Get a setting value by key (backwards compatibility - uses first found)"""
-        setting = AppSettings.query.filter_by(setting_key=key.upper()).first()
+        setting = db.session.scalar(
+            db.select(AppSettings).where(AppSettings.setting_key == AppSettings._normalize_key(key)).limit(1)
+        )
         return setting.get_value(default) if setting else default
     
     @staticmethod
     def set_setting(key, value):
         """Set a setting value by key (backwards compatibility - updates first found)"""
-        setting = AppSettings.query.filter_by(setting_key=key.upper()).first()
+        setting = AppSettings._set_setting_nocommit(key, value)
+        db.session.commit()
+        return setting
+    
+    @staticmethod
+    def _set_setting_nocommit(key, value):
+        """Stage a global setting write in the current transaction"""
+        key = AppSettings._normalize_key(key)
+        setting = AppSettings.query.filter_by(setting_key=key).first()
         if setting:
             setting.set_value(value)
             setting.updated_at = db.func.current_timestamp()
         else:
-            setting = AppSettings(setting_key=key.upper())
+            setting = AppSettings(setting_key=key)
             setting.set_value(value)
             db.session.add(setting)
-        
-        db.session.commit()
         return setting
     
     @staticmethod
     def get_user_setting(user_id, key, default=None):
-        """Get a setting value by key for specific user"""
-        setting = AppSettings.query.filter_by(setting_key=key.upper(), user_id=user_id).first()
+        """Get a setting value by key for specific user (memoized for the current request)"""
+        key = AppSettings._normalize_key(key)
+        cache = g.setdefault('_app_settings_cache', {}) if has_app_context() else {}
+        setting = cache.get((user_id, key), _MISSING)
+        if setting is _MISSING:
+            setting = cache[(user_id, key)] = db.session.scalar(
+                db.select(AppSettings).where(
+                    AppSettings.user_id == user_id,
+                    AppSettings.setting_key == key
+                ).limit(1)
+            )
         return setting.get_value(default) if setting else default
     
     @staticmethod
     def set_user_setting(user_id, key, value):
         """Set a setting value by key for specific user"""
-        setting = AppSettings.query.filter_by(setting_key=key.upper(), user_id=user_id).first()
+        setting = AppSettings._set_user_setting_nocommit(user_id, key, value)
+        db.session.commit()
+        return setting
+    
+    @staticmethod
+    def _set_user_setting_nocommit(user_id, key, value):
+        """Stage a user setting write in the current transaction (single upsert where supported)"""
+        key = AppSettings._normalize_key(key)
+        if has_app_context():
+            g.pop('_wise_config_cache', None)
+            g.get('_app_settings_cache', {}).pop((user_id, key), None)
+        
+        insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+        if insert is None:
+            return AppSettings._set_user_setting_fallback(user_id, key, value)
+        
+        if not key:
+            raise ValueError("Setting key cannot be empty")
+        setting_value = AppSettings._serialize(value)
+        
+        stmt = insert(AppSettings).values(
+            user_id=user_id, setting_key=key, setting_value=setting_value
+        ).on_conflict_do_update(
+            index_elements=['user_id', 'setting_key'],
+            set_={'setting_value': setting_value, 'updated_at': db.func.current_timestamp()}
+        ).returning(AppSettings)
+        return db.session.scalars(stmt, execution_options={'populate_existing': True}).one()
+    
+    @staticmethod
+    def _set_user_setting_fallback(user_id, key, value):
+        """SELECT-then-write path for dialects without ON CONFLICT"""
+        key = AppSettings._normalize_key(key)
+        setting = AppSettings.query.filter_by(setting_key=key, user_id=user_id).first()
         if setting:
             setting.set_value(value)
             setting.updated_at = db.func.current_timestamp()
         else:
-            setting = AppSettings(setting_key=key.upper(), user_id=user_id)
+            setting = AppSettings(setting_key=key, user_id=user_id)
             setting.set_value(value)
             db.session.add(setting)
-        
-        db.session.commit()
         return setting
     
+    @staticmethod
+    def _build_wise_config(settings_by_key):
+        """Map stored Wise settings onto the config dict, filling in defaults"""
+        config = {}
+        for name, (key, default) in WISE_CONFIG_KEYS.items():
+            setting = settings_by_key.get(key)
+            config[name] = setting.get_value(default) if setting else default
+        return config
+    
     @staticmethod
     def get_wise_config():
-        """Get Wise API configuration"""
-        return {
-            'api_url': AppSettings.get_setting('WISE_API_URL', 'https://api.wise.com'),
-            'api_token': AppSettings.get_setting('WISE_API_TOKEN', ''),
-            'entity_number': AppSettings.get_setting('WISE_ENTITY_NUMBER', ''),
-            'is_sandbox': AppSettings.get_setting('WISE_SANDBOX_MODE', False)
-        }
+        """Get Wise API configuration (one query for all keys, first found per key)"""
+        keys = [key for key, _ in WISE_CONFIG_KEYS.values()]
+        rows = AppSettings.query.filter(
+            AppSettings.setting_key.in_(keys)
+        ).order_by(AppSettings.id).all()
+        
+        settings_by_key = {}
+        for row in rows:
+            settings_by_key.setdefault(row.setting_key, row)
+        return AppSettings._build_wise_config(settings_by_key)
+    
+    @staticmethod
+    def get_user_settings_bulk(user_id, keys):
+        """Get several settings for specific user in one query, as a dict of key to setting (first found per key)"""
+        keys = [AppSettings._normalize_key(key) for key in keys]
+        rows = AppSettings.query.filter(
+            AppSettings.user_id == user_id,
+            AppSettings.setting_key.in_(keys)
+        ).order_by(AppSettings.id).all()
+        
+        settings_by_key = {}
+        for row in rows:
+            settings_by_key.setdefault(row.setting_key, row)
+        return settings_by_key
+    
+    @staticmethod
+    def get_user_wise_config(user_id):
+        """Get Wise API configuration for specific user (one query, memoized for the current request)"""
+        cache = g.setdefault('_wise_config_cache', {}) if has_app_context() else {}
+        if user_id not in cache:
+            keys = [key for key, _ in WISE_CONFIG_KEYS.values()]
+            cache[user_id] = AppSettings._build_wise_config(
+                AppSettings.get_user_settings_bulk(user_id, keys)
+            )
+        # Callers add display-only keys, so hand out a copy
+        return dict(cache[user_id])
     
     @staticmethod
     def set_wise_config(api_url, api_token, entity_number, is_sandbox=False):
-        """Set Wise API configuration"""
-        AppSettings.set_setting('WISE_API_URL', api_url)
-        AppSettings.set_setting('WISE_API_TOKEN', api_token)
-        AppSettings.set_setting('WISE_ENTITY_NUMBER', entity_number)
-        AppSettings.set_setting('WISE_SANDBOX_MODE', is_sandbox)
+        """Set Wise API configuration in a single transaction"""
+        AppSettings._set_setting_nocommit(WISE_API_URL, api_url)
+        AppSettings._set_setting_nocommit(WISE_API_TOKEN, api_token)
+        AppSettings._set_setting_nocommit(WISE_ENTITY_NUMBER, entity_number)
+        AppSettings._set_setting_nocommit(WISE_SANDBOX_MODE, is_sandbox)
+        db.session.commit()
+    
+    @staticmethod
+    def set_user_wise_config(user_id, api_url, api_token, entity_number, is_sandbox=False):
+        """Set Wise API configuration for specific user in a single transaction"""
+        AppSettings._set_user_setting_nocommit(user_id, WISE_API_URL, api_url)
+        AppSettings._set_user_setting_nocommit(user_id, WISE_API_TOKEN, api_token)
+        AppSettings._set_user_setting_nocommit(user_id, WISE_ENTITY_NUMBER, entity_number)
+        AppSettings._set_user_setting_nocommit(user_id, WISE_SANDBOX_MODE, is_sandbox)
+        db.session.commit()
     
     def __repr__(self):
         return f'<AppSettings {self.setting_key}: {self.setting_value[:50] if self.setting_value else None}>'
\ No newline at end of file
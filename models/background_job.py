@@ -0,0 +1,18 @@
+from datetime import datetime, timezone
+from . import db
+
+class BackgroundJob(db.Model):
+    """A bank sync or CSV import running on one worker's background pool, pollable from any worker"""
+    __tablename__ = 'background_job'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, handed to the client as the job ID
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, finished or failed
+    messages = db.Column(db.JSON, nullable=False, default=list)  # [message, category] pairs to flash
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)  # Index for purging
+    finished_at = db.Column(db.DateTime)
+
+    user = db.relationship('User', back_populates='background_jobs')
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.id}: {self.status}>'
@@ -9,6 +9,8 @@ class Document(db.Model):
     upload_date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)  # Index for date sorting
     file_size = db.Column(db.Integer)  # Size in bytes
     
+    user = db.relationship('User', back_populates='documents')
+    
     def __repr__(self):
         return f'<Document {self.id}: {self.filename}>'
     
@@ -0,0 +1,54 @@
+"""
+Upgrades for databases created by older versions.
+create_all() only adds missing tables, so init_db runs these afterwards; each one
+checks the live schema first and does nothing once it has been applied.
+"""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects.postgresql import JSONB
+from . import db
+
+
+def upgrade_schema():
+    """Bring the indexes and column types of existing tables in line with the models"""
+    _ensure_app_settings_key_index()
+    _ensure_users_settings_jsonb()
+
+
+def _ensure_app_settings_key_index():
+    """Create the unique (user_id, setting_key) index settings upserts use as their ON CONFLICT target"""
+    index_names = {index['name'] for index in inspect(db.engine).get_indexes('app_settings')}
+    if 'ix_app_settings_user_key' in index_names:
+        return
+
+    with db.engine.begin() as conn:
+        # Older versions allowed duplicate keys per user; keep the first row,
+        # which is the one the settings getters and setters already used
+        conn.execute(text('''
+        DELETE FROM app_settings
+        WHERE user_id IS NOT NULL AND id NOT IN (
+            SELECT MIN(id) FROM app_settings
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id, setting_key
+        )
+        '''))
+        conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS ix_app_settings_user_key ON app_settings (user_id, setting_key)'))
+        conn.execute(text('DROP INDEX IF EXISTS ix_app_settings_setting_key'))
+
+
+def _ensure_users_settings_jsonb():
+    """
+    Convert users.settings to JSONB on PostgreSQL. Older versions stored it as TEXT,
+    which psycopg returns as a str the MutableDict column cannot load
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+
+    columns = {column['name']: column['type'] for column in inspect(db.engine).get_columns('users')}
+    with db.engine.begin() as conn:
+        if not isinstance(columns['settings'], JSONB):
+            # Empty strings were the old "no settings" value and aren't valid JSON
+            conn.execute(text(
+                "ALTER TABLE users ALTER COLUMN settings TYPE JSONB USING NULLIF(settings::text, '')::jsonb"
+            ))
+        conn.execute(text('CREATE INDEX IF NOT EXISTS idx_users_settings_gin ON users USING gin (settings)'))
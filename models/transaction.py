@@ -1,4 +1,5 @@
 from datetime import datetime, timezone
+from sqlalchemy import bindparam, func
 from . import db
 
 # Association table for many-to-many relationship between transactions and documents
@@ -8,30 +9,142 @@ transaction_documents = db.Table('transaction_documents',
 )
 
 class Transaction(db.Model):
+    BULK_INSERT_CHUNK_SIZE = 1000  # Rows per multi-row INSERT
+    
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)  # Required for multi-user support
-    date = db.Column(db.Date, nullable=False, index=True)  # Index for date queries
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Indexed via idx_transaction_user_date
+    # Filter ranges half-open (date >= start, date < end + 1 day) and never wrap the column
+    # in a function, so the filter stays correct and index-friendly if it becomes a timestamp
+    date = db.Column(db.Date, nullable=False)  # Indexed via idx_transaction_date_amount
     amount = db.Column(db.Numeric(precision=15, scale=2), nullable=False, index=True)  # Precise decimal for currency
-    currency = db.Column(db.String(3), nullable=False, index=True)  # Index for currency grouping
+    currency = db.Column(db.String(3), nullable=False)  # Indexed via idx_transaction_currency_date
     description = db.Column(db.Text, nullable=False)
     payment_reference = db.Column(db.String(255), index=True)  # Index for duplicate detection
     payee_name = db.Column(db.String(255), index=True)  # Index for filtering and duplicate detection
     merchant = db.Column(db.String(255))
-    status = db.Column(db.String(50), default='unmatched', index=True)  # Index for status filtering
+    status = db.Column(db.String(50), default='unmatched')  # Indexed via idx_transaction_status_date
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)  # Index for sorting
     
     # Relationships
-    documents = db.relationship('Document', secondary=transaction_documents, backref='transactions')
+    documents = db.relationship('Document', secondary=transaction_documents, backref='transactions', lazy='selectin')  # One IN query per batch
     transaction_code = db.relationship('TransactionCode', backref='transaction', uselist=False)
+    user = db.relationship('User', back_populates='transactions')
     
     # Composite indexes for common query patterns
     __table_args__ = (
+        # Every per-user list, date range and dashboard query; on PostgreSQL the INCLUDE
+        # columns let the per-currency totals be summed with an index-only scan
+        db.Index(
+            'idx_transaction_user_date', 'user_id', 'date',
+            postgresql_include=['id', 'currency', 'amount']
+        ),
         db.Index('idx_transaction_date_amount', 'date', 'amount'),  # For duplicate detection
         db.Index('idx_transaction_date_desc', 'date', 'description'),  # For duplicate detection with description
         db.Index('idx_transaction_currency_date', 'currency', 'date'),  # For currency-specific date queries
         db.Index('idx_transaction_status_date', 'status', 'date'),  # For status filtering with date sorting
     )
     
+    @classmethod
+    def bulk_insert(cls, rows):
+        """Insert a list of column dicts in chunks without building ORM objects (caller commits)"""
+        if not rows:
+            return
+        if db.session.get_bind().dialect.name == 'postgresql':
+            cls._copy_insert(rows)
+            return
+        
+        # A Core table insert skips the ORM bulk-insert layer and returns no primary keys,
+        # so each chunk is one plain executemany
+        statement = cls.__table__.insert()
+        for start in range(0, len(rows), cls.BULK_INSERT_CHUNK_SIZE):
+            db.session.execute(statement, rows[start:start + cls.BULK_INSERT_CHUNK_SIZE])
+    
+    @classmethod
+    def _copy_insert(cls, rows):
+        """Stream rows into PostgreSQL with COPY FROM STDIN on the session's connection"""
+        from utils.dashboard_cache import invalidate_users
+        
+        # COPY bypasses SQLAlchemy, so Python-side column defaults are applied here
+        columns = [column for column in cls.__table__.columns if column.name != 'id']
+        scalar_defaults = {
+            column.name: column.default.arg for column in columns
+            if column.default is not None and not column.default.is_callable
+        }
+        callable_defaults = [
+            (column.name, column.default.arg) for column in columns
+            if column.default is not None and column.default.is_callable
+        ]
+        
+        column_list = ', '.join(f'"{column.name}"' for column in columns)
+        statement = f'COPY "{cls.__table__.name}" ({column_list}) FROM STDIN'
+        
+        # The session's connection keeps the COPY inside the caller's transaction
+        driver_connection = db.session.connection().connection.driver_connection
+        with driver_connection.cursor() as cursor, cursor.copy(statement) as copy:
+            for row in rows:
+                values = {**scalar_defaults, **row}
+                for name, default in callable_defaults:
+                    if name not in values:
+                        values[name] = default(None)  # SQLAlchemy wraps them to take an execution context
+                copy.write_row([values.get(column.name) for column in columns])
+        
+        # Session events don't see COPY; flag the users whose dashboards it changed
+        invalidate_users(db.session, {row['user_id'] for row in rows})
+    
+    @classmethod
+    def bulk_fill_missing(cls, rows):
+        """
+        Fill blank columns of existing rows in executemany UPDATEs (caller commits).
+        rows are dicts of 'id' plus column values; None or a column that is already
+        set leaves the stored value alone.
+        """
+        if not rows:
+            return
+        table = cls.__table__
+        columns = [name for name in rows[0] if name != 'id']
+        # Bind names must not clash with the column names being SET
+        statement = table.update().where(table.c.id == bindparam('b_id')).values({
+            name: func.coalesce(func.nullif(table.c[name], ''), bindparam(f'b_{name}'), table.c[name])
+            for name in columns
+        })
+        params = [{f'b_{name}': value for name, value in row.items()} for row in rows]
+        for start in range(0, len(params), cls.BULK_INSERT_CHUNK_SIZE):
+            db.session.execute(statement, params[start:start + cls.BULK_INSERT_CHUNK_SIZE])
+    
+    @classmethod
+    def bulk_delete(cls, user_id, transaction_ids):
+        """
+        Delete a user's transactions with their codes and documents in a few set-based
+        statements (caller commits). Returns (deleted_count, document_file_paths) so the
+        caller can remove the files once the delete is committed.
+        """
+        from .document import Document
+        from .transaction_code import TransactionCode
+        
+        owned_ids = db.select(cls.id).where(cls.id.in_(transaction_ids), cls.user_id == user_id)
+        ids = db.session.execute(owned_ids).scalars().all()
+        if not ids:
+            return 0, []
+        
+        link = transaction_documents.c
+        document_rows = db.session.execute(
+            db.select(Document.id, Document.file_path).join(
+                transaction_documents, link.document_id == Document.id
+            ).where(link.transaction_id.in_(ids)).distinct()
+        ).all()
+        document_ids = [document_id for document_id, _ in document_rows]
+        
+        # Children first: codes and document links reference the transactions
+        db.session.execute(db.delete(TransactionCode).where(TransactionCode.transaction_id.in_(ids)))
+        db.session.execute(transaction_documents.delete().where(
+            link.transaction_id.in_(ids) | link.document_id.in_(document_ids)
+        ))
+        if document_ids:
+            db.session.execute(db.delete(Document).where(Document.id.in_(document_ids)))
+        db.session.execute(db.delete(cls).where(cls.id.in_(ids)))
+        
+        return len(ids), [file_path for _, file_path in document_rows]
+    
     def __repr__(self):
         return f'<Transaction {self.id}: {self.date} - {self.amount} {self.currency}>'
     
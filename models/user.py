@@ -1,11 +1,49 @@
+from flask import g, has_app_context
 from models import db
+from sqlalchemy import DDL, event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.ext.mutable import MutableDict
+from sqlalchemy.orm import load_only, raiseload
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import os
 import secrets
 
+# Pinned so hashes don't silently change with Werkzeug upgrades; older hashes
+# are upgraded to this method on the next successful login
+PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+
+# Hashing runs on a bounded pool: hashlib releases the GIL during scrypt, and
+# capping concurrency at the CPU count keeps a login burst from allocating
+# scrypt's 32MB work buffer per request thread all at once
+_hash_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='password-hash')
+
+def _hash_password(password):
+    """Hash a password with PASSWORD_HASH_METHOD on the hashing pool"""
+    return _hash_pool.submit(generate_password_hash, password, method=PASSWORD_HASH_METHOD).result()
+
+def _verify_password(password_hash, password):
+    """Check a password against a hash on the hashing pool"""
+    return _hash_pool.submit(check_password_hash, password_hash, password).result()
+
+@lru_cache(maxsize=1)
+def _dummy_password_hash():
+    """Hash of a random password, verified against when there is no real hash to check"""
+    return _hash_password(secrets.token_urlsafe(16))
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Covers the login lookup (see get_for_login); PostgreSQL can answer it
+        # with an index-only scan thanks to the INCLUDE columns
+        db.Index(
+            'idx_users_email_active_covering', 'email', 'is_active',
+            postgresql_include=['id', 'password_hash', 'first_name', 'email_verified', 'user_folder']
+        ),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
@@ -14,40 +52,106 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     email_verified = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Timestamps are computed by the database (CURRENT_TIMESTAMP) in the
+    # INSERT/UPDATE itself; server_default covers tables created from here on
+    created_at = db.Column(db.DateTime, default=db.func.now(), server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, default=db.func.now(), server_default=db.func.now(), onupdate=db.func.now())
     last_login = db.Column(db.DateTime)
     
     # Generate unique user folder for file uploads
     user_folder = db.Column(db.String(32), unique=True, nullable=False)
     
-    # User settings (JSON field for flexibility)
-    settings = db.Column(db.Text)  # JSON string for user preferences
+    # User settings (JSON field for flexibility). JSONB on PostgreSQL so keys can
+    # be queried server-side; MutableDict tracks in-place changes
+    settings = db.Column(MutableDict.as_mutable(db.JSON().with_variant(JSONB(), 'postgresql')), default=dict)
     
-    # Relationships (user owns their data)
-    transactions = db.relationship('Transaction', backref='user', lazy='dynamic', cascade='all, delete-orphan')
-    transaction_codes = db.relationship('TransactionCode', backref='user', lazy='dynamic', cascade='all, delete-orphan')
-    documents = db.relationship('Document', backref='user', lazy='dynamic', cascade='all, delete-orphan')
-    app_settings = db.relationship('AppSettings', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    # Relationships (user owns their data). These exist for the delete cascade;
+    # reading them raises, so query the child table filtered by user_id instead
+    transactions = db.relationship('Transaction', back_populates='user', lazy='raise', cascade='all, delete-orphan')
+    transaction_codes = db.relationship('TransactionCode', back_populates='user', lazy='raise', cascade='all, delete-orphan')
+    documents = db.relationship('Document', back_populates='user', lazy='raise', cascade='all, delete-orphan')
+    app_settings = db.relationship('AppSettings', back_populates='user', lazy='raise', cascade='all, delete-orphan')
+    background_jobs = db.relationship('BackgroundJob', back_populates='user', lazy='raise', cascade='all, delete-orphan')
     
     def __init__(self, **kwargs):
         super(User, self).__init__(**kwargs)
         if not self.user_folder:
             self.user_folder = secrets.token_urlsafe(16)  # Generate unique folder name
     
+    @classmethod
+    def get_by_id(cls, user_id):
+        """Get a user by id, reusing the user already loaded in this request"""
+        cached = g.get('_user_cache') if has_app_context() else None
+        if cached is not None and cached.id == user_id:
+            return cached
+        # Relationships must be asked for explicitly, so accidental lazy loads
+        # on current_user fail loudly instead of adding queries to every page
+        user = db.session.get(cls, user_id, options=[raiseload('*')])
+        if user is not None and has_app_context():
+            g._user_cache = user
+        return user
+    
+    @classmethod
+    def get_by_email(cls, email):
+        """Get a user by email, reusing the user already loaded in this request"""
+        cached = g.get('_user_cache') if has_app_context() else None
+        if cached is not None and cached.email == email:
+            return cached
+        user = cls.query.filter_by(email=email).first()
+        if user is not None and has_app_context():
+            g._user_cache = user
+        return user
+    
+    @classmethod
+    def get_for_login(cls, email):
+        """Get a user by email, loading only the columns the login flow reads"""
+        return db.session.scalars(
+            db.select(cls).where(cls.email == email).options(
+                load_only(cls.id, cls.email, cls.password_hash, cls.is_active,
+                          cls.first_name, cls.email_verified, cls.user_folder),
+                raiseload('*')
+            ).limit(1)
+        ).first()
+    
+    @staticmethod
+    def clear_request_cache():
+        """Forget the user cached for this request (after the user is deleted)"""
+        g.pop('_user_cache', None)
+    
     def set_password(self, password):
         """Hash and set user password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = _hash_password(password)
+    
+    def check_password(self, password, rehash=True):
+        """Check if provided password matches hash, rehashing legacy hashes on success"""
+        if not self.password_hash:
+            return User.check_password_without_user(password)
+        if not _verify_password(self.password_hash, password):
+            return False
+        if rehash and self.password_needs_rehash():
+            self.set_password(password)  # Saved with the caller's next commit
+        return True
     
-    def check_password(self, password):
-        """Check if provided password matches hash"""
-        return check_password_hash(self.password_hash, password)
+    @staticmethod
+    def check_password_without_user(password):
+        """Spend the time of a real check and fail, so unknown emails can't be told apart by timing"""
+        _verify_password(_dummy_password_hash(), password)
+        return False
     
-    @property
+    def password_needs_rehash(self):
+        """Check if the stored hash was made with a method other than PASSWORD_HASH_METHOD"""
+        return not self.password_hash.startswith(PASSWORD_HASH_METHOD + '$')
+    
+    @hybrid_property
     def full_name(self):
         """Get user's full name"""
         return f"{self.first_name} {self.last_name}"
     
+    @full_name.expression
+    def full_name(cls):
+        """Full name as a SQL expression, so queries can filter and sort on it"""
+        return cls.first_name + ' ' + cls.last_name
+    
     @property 
     def upload_path(self):
         """Get user's unique upload directory path"""
@@ -56,17 +160,17 @@ class User(UserMixin, db.Model):
     def get_wise_config(self):
         """Get user's Wise API configuration"""
         from models.app_settings import AppSettings
-        return {
-            'api_url': AppSettings.get_user_setting(self.id, 'WISE_API_URL', 'https://api.wise.com'),
-            'api_token': AppSettings.get_user_setting(self.id, 'WISE_API_TOKEN', ''),
-            'entity_number': AppSettings.get_user_setting(self.id, 'WISE_ENTITY_NUMBER', ''),
-            'is_sandbox': AppSettings.get_user_setting(self.id, 'WISE_SANDBOX_MODE', False)
-        }
+        return AppSettings.get_user_wise_config(self.id)
     
     def update_last_login(self):
-        """Update last login timestamp"""
-        self.last_login = datetime.utcnow()
-        db.session.commit()
+        """Update last login timestamp (saved with the caller's commit)"""
+        self.last_login = db.func.now()  # Rendered into the flush's UPDATE/INSERT
     
     def __repr__(self):
-        return f'<User {self.email}>'
\ No newline at end of file
+        return f'<User {self.email}>'
+
+# GIN index for key existence/containment queries on settings (PostgreSQL only)
+event.listen(
+    User.__table__, 'after_create',
+    DDL('CREATE INDEX IF NOT EXISTS idx_users_settings_gin ON users USING gin (settings)').execute_if(dialect='postgresql')
+)
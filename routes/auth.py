@@ -1,8 +1,9 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, session
 from flask_login import login_user, logout_user, login_required, current_user
-from models import db, User
+from models import db, User, Transaction, Document, AppSettings
+from services.file_service import FileService
 from utils.validation import InputValidator, ValidationError
-import re
+import hmac
 import os
 
 auth_bp = Blueprint('auth', __name__)
@@ -23,17 +24,19 @@ def login():
             flash('Please enter both email and password', 'error')
             return render_template('auth/login.html')
         
-        # Find user
-        user = User.query.filter_by(email=email).first()
+        # Find user. Unknown and deactivated accounts are checked against a
+        # dummy hash, so every login costs one hash verify and takes the same time
+        user = User.get_for_login(email)
+        if user is None or not user.is_active:
+            authenticated = User.check_password_without_user(password)
+        else:
+            authenticated = user.check_password(password)
         
-        if user and user.check_password(password):
-            if not user.is_active:
-                flash('Your account has been deactivated. Please contact support.', 'error')
-                return render_template('auth/login.html')
-            
+        if authenticated:
             # Login successful
             login_user(user, remember=remember_me)
             user.update_last_login()
+            db.session.commit()  # Also saves a rehashed password
             
             # Redirect to intended page or dashboard
             next_page = request.args.get('next')
@@ -55,62 +58,37 @@ def register():
     
     if request.method == 'POST':
         try:
-            # Get form data
-            email = request.form.get('email', '').strip().lower()
-            first_name = request.form.get('first_name', '').strip()
-            last_name = request.form.get('last_name', '').strip()
-            password = request.form.get('password', '')
-            confirm_password = request.form.get('confirm_password', '')
-            
-            # Validate required fields
-            if not all([email, first_name, last_name, password, confirm_password]):
-                flash('All fields are required', 'error')
-                return render_template('auth/register.html')
-            
-            # Validate email format
-            email_pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
-            if not email_pattern.match(email):
-                flash('Please enter a valid email address', 'error')
+            # Validate the whole form first; the database is only asked about
+            # the email once everything else is valid
+            try:
+                data = InputValidator.validate_registration(request.form)
+            except ValidationError as e:
+                flash(str(e), 'error')
                 return render_template('auth/register.html')
             
             # Check if email already exists
-            if User.query.filter_by(email=email).first():
+            if User.get_by_email(data['email']):
                 flash('An account with this email already exists', 'error')
                 return render_template('auth/register.html')
             
-            # Validate password strength
-            if len(password) < 8:
-                flash('Password must be at least 8 characters long', 'error')
-                return render_template('auth/register.html')
-            
-            if password != confirm_password:
-                flash('Passwords do not match', 'error')
-                return render_template('auth/register.html')
-            
-            # Validate names
-            if len(first_name) < 2 or len(last_name) < 2:
-                flash('First and last names must be at least 2 characters long', 'error')
-                return render_template('auth/register.html')
-            
             # Create new user
             user = User(
-                email=email,
-                first_name=first_name.title(),
-                last_name=last_name.title()
+                email=data['email'],
+                first_name=data['first_name'],
+                last_name=data['last_name']
             )
-            user.set_password(password)
+            user.set_password(data['password'])
             
-            # Create user's upload directory
-            os.makedirs(user.upload_path, exist_ok=True)
-            os.makedirs(os.path.join(user.upload_path, 'pdfs'), exist_ok=True)
+            # No upload directory here: uploads create their directories with
+            # makedirs(exist_ok=True) when the first file is saved
             
-            # Save to database
+            # Save to database, with the login timestamp in the same commit
+            user.update_last_login()
             db.session.add(user)
             db.session.commit()
             
             # Auto-login the new user
             login_user(user)
-            user.update_last_login()
             
             flash(f'Welcome to Bookkeeping App, {user.first_name}! Your account has been created.', 'success')
             return redirect(url_for('main.dashboard'))
@@ -134,7 +112,14 @@ def logout():
 @login_required
 def profile():
     """User profile page"""
-    return render_template('auth/profile.html', user=current_user)
+    # Plain COUNTs as scalar subqueries, fetched together in one round trip
+    keys = ('transactions', 'documents', 'app_settings')
+    counts = db.session.execute(db.select(*(
+        db.select(db.func.count(model.id)).where(model.user_id == current_user.id).scalar_subquery()
+        for model in (Transaction, Document, AppSettings)
+    ))).one()
+    stats = dict(zip(keys, counts))
+    return render_template('auth/profile.html', user=current_user, stats=stats)
 
 @auth_bp.route('/profile/edit', methods=['GET', 'POST'])
 @login_required
@@ -164,12 +149,7 @@ def edit_profile():
             
             # Handle password change
             if new_password:
-                # Verify current password
-                if not current_user.check_password(current_password):
-                    flash('Current password is incorrect', 'error')
-                    return render_template('auth/edit_profile.html')
-                
-                # Validate new password
+                # Validate new password (cheap checks before the hash verify)
                 if len(new_password) < 8:
                     flash('New password must be at least 8 characters long', 'error')
                     return render_template('auth/edit_profile.html')
@@ -178,6 +158,11 @@ def edit_profile():
                     flash('New passwords do not match', 'error')
                     return render_template('auth/edit_profile.html')
                 
+                # Verify current password (no rehash, it is replaced below)
+                if not current_user.check_password(current_password, rehash=False):
+                    flash('Current password is incorrect', 'error')
+                    return render_template('auth/edit_profile.html')
+                
                 # Update password
                 current_user.set_password(new_password)
             
@@ -204,20 +189,25 @@ def delete_account():
         return redirect(url_for('auth.profile'))
     
     # Verify confirmation text
-    if confirm_text != 'DELETE':
+    if not hmac.compare_digest(confirm_text.encode(), b'DELETE'):
         flash('Please type "DELETE" to confirm account deletion', 'error')
         return redirect(url_for('auth.profile'))
     
+    retired_path = None
     try:
-        # Delete user's upload directory
-        import shutil
-        if os.path.exists(current_user.upload_path):
-            shutil.rmtree(current_user.upload_path)
+        # Rename the user's upload directory now; the slow delete of its files
+        # runs in the background once the account is gone
+        upload_path = current_user.upload_path
+        retired_path = FileService.retire_directory(upload_path)
         
         # User deletion will cascade to all related data
         user_email = current_user.email
         db.session.delete(current_user)
         db.session.commit()
+        User.clear_request_cache()
+        
+        if retired_path:
+            FileService.remove_directory_in_background(retired_path)
         
         # Logout and redirect
         logout_user()
@@ -226,6 +216,8 @@ def delete_account():
         
     except Exception as e:
         db.session.rollback()
+        if retired_path:
+            os.rename(retired_path, upload_path)  # Account still exists, so restore its files
         flash(f'Error deleting account: {str(e)}', 'error')
         return redirect(url_for('auth.profile'))
 
@@ -239,12 +231,8 @@ def change_password():
         new_password = request.form.get('new_password', '')
         confirm_password = request.form.get('confirm_password', '')
         
-        # Validate current password
-        if not current_user.check_password(current_password):
-            flash('Current password is incorrect', 'error')
-            return redirect(url_for('auth.profile'))
-        
-        # Validate new password - consistent with registration requirements
+        # Validate new password - consistent with registration requirements.
+        # These cheap checks run before the hash verify
         if len(new_password) < 8:
             flash('New password must be at least 8 characters long', 'error')
             return redirect(url_for('auth.profile'))
@@ -253,10 +241,15 @@ def change_password():
             flash('New passwords do not match', 'error')
             return redirect(url_for('auth.profile'))
         
-        if current_password == new_password:
+        if hmac.compare_digest(current_password.encode(), new_password.encode()):
             flash('New password must be different from current password', 'error')
             return redirect(url_for('auth.profile'))
         
+        # Validate current password (no rehash, it is replaced below)
+        if not current_user.check_password(current_password, rehash=False):
+            flash('Current password is incorrect', 'error')
+            return redirect(url_for('auth.profile'))
+        
         # Update password
         current_user.set_password(new_password)
         db.session.commit()
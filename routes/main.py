@@ -1,63 +1,66 @@
-from flask import Blueprint, render_template, flash, redirect, url_for, jsonify, request
+from flask import Blueprint, Response, render_template, flash, redirect, url_for, jsonify, request
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta, timezone
 import csv
 import io
-import os
+import logging
 from models import db, Transaction, TransactionCode, User
-from services.wise_api import WiseAPIService
+from services import background_jobs
+from services.bank_sync import BankSyncService
+from services.csv_import import CsvImportService
+from services.file_service import FileService
 from config import Config
 from utils.transaction_deduplication import TransactionDeduplicator
 from utils.validation import InputValidator, ValidationError
+from utils import dashboard_cache
 
 main_bp = Blueprint('main', __name__)
 
-@main_bp.route('/')
-@login_required
-def dashboard():
-    """Dashboard with overview stats and sync button"""
-    
-    # Get stats for dashboard (user-filtered) - optimized queries
+logger = logging.getLogger(__name__)
+
+def _dashboard_stats(user_id, current_year_start):
+    """Compute the dashboard counts and YTD totals by currency for a user"""
     from sqlalchemy import func
-    from models import Document
     
-    # Single query for total transactions
-    total_transactions = db.session.query(func.count(Transaction.id)).filter(
-        Transaction.user_id == current_user.id
-    ).scalar() or 0
-    
-    # Query for reconciled transactions (those with documents)
-    reconciled_transactions = db.session.query(func.count(Transaction.id)).join(
-        Document, Transaction.documents
-    ).filter(Transaction.user_id == current_user.id).scalar() or 0
+    # Single query for total and reconciled (those with documents) transactions
+    total_transactions, reconciled_transactions = db.session.execute(
+        db.select(
+            func.count(Transaction.id),
+            func.coalesce(func.sum(db.case((Transaction.documents.any(), 1), else_=0)), 0)
+        ).filter(Transaction.user_id == user_id)
+    ).one()
     
     # Calculate unreconciled
     unreconciled_transactions = total_transactions - reconciled_transactions
     
-    # Get recent transactions (user-filtered)
-    recent_transactions = Transaction.query.filter_by(user_id=current_user.id).order_by(Transaction.date.desc()).limit(5).all()
-    
-    # Calculate Year to Date totals BY CURRENCY (fixing the currency mixing bug)
-    current_year_start = datetime.now().replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    # Get all transactions with their currencies for YTD period (user-filtered)
-    ytd_transactions = db.session.query(Transaction, TransactionCode).join(TransactionCode).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.date >= current_year_start
+    # Sum the YTD amounts per currency and category in the database (user-filtered);
+    # groups come back in order of their first transaction, as the row-by-row loop saw them
+    ytd_totals = db.session.execute(
+        db.select(
+            Transaction.currency,
+            TransactionCode.category_name,
+            func.sum(Transaction.amount),
+            func.sum(func.abs(Transaction.amount, type_=Transaction.amount.type))
+        ).join_from(Transaction, TransactionCode).filter(
+            Transaction.user_id == user_id,
+            Transaction.date >= current_year_start
+        ).group_by(
+            Transaction.currency, TransactionCode.category_name
+        ).order_by(func.min(Transaction.id))
     ).all()
     
     # Calculate totals by currency
     currency_totals = {}
-    for transaction, code in ytd_transactions:
-        currency = transaction.currency or 'USD'
+    for currency, category_name, amount_sum, abs_amount_sum in ytd_totals:
+        currency = currency or 'USD'
         
         if currency not in currency_totals:
             currency_totals[currency] = {'revenue': 0, 'expense': 0, 'profit': 0}
         
-        if code.category_name == 'Revenue':
-            currency_totals[currency]['revenue'] += transaction.amount
-        elif code.category_name == 'Expense':
-            currency_totals[currency]['expense'] += abs(transaction.amount)
+        if category_name == 'Revenue':
+            currency_totals[currency]['revenue'] += amount_sum
+        elif category_name == 'Expense':
+            currency_totals[currency]['expense'] += abs_amount_sum
     
     # Calculate profit for each currency
     for currency in currency_totals:
@@ -71,7 +74,7 @@ def dashboard():
     ytd_expenses = currency_totals.get(primary_currency, {}).get('expense', 0)
     profit = currency_totals.get(primary_currency, {}).get('profit', 0)
     
-    stats = {
+    return {
         'total_transactions': total_transactions,
         'unreconciled_transactions': unreconciled_transactions,
         'reconciled_transactions': reconciled_transactions,
@@ -82,6 +85,35 @@ def dashboard():
         'primary_currency': primary_currency,
         'has_multiple_currencies': len(currency_totals) > 1
     }
+
+@main_bp.route('/')
+@login_required
+def dashboard():
+    """Dashboard with overview stats and sync button"""
+    
+    # Calculate Year to Date totals BY CURRENCY (fixing the currency mixing bug)
+    current_year_start = datetime.now().replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    
+    # Resolve the current_user proxy once
+    user_id = current_user.id
+    
+    # Stats are reused until they expire or a commit touches the user's data
+    stats_cache = dashboard_cache.get_cache()
+    stats = stats_cache.get(user_id)
+    if stats is None:
+        stats = _dashboard_stats(user_id, current_year_start)
+        stats_cache.set(user_id, stats)
+    
+    # Get recent transactions (user-filtered), loading only the columns the template shows.
+    # It reads transaction_code only for is_coded/status_display, and never documents
+    recent_transactions = Transaction.query.options(
+        db.load_only(
+            Transaction.date, Transaction.description, Transaction.payee_name,
+            Transaction.amount, Transaction.currency
+        ),
+        db.joinedload(Transaction.transaction_code).load_only(TransactionCode.category_name),
+        db.lazyload(Transaction.documents)
+    ).filter_by(user_id=user_id).order_by(Transaction.date.desc()).limit(5).all()
     
     return render_template('dashboard.html', 
                          stats=stats, 
@@ -91,80 +123,32 @@ def dashboard():
 @main_bp.route('/sync-bank')
 @login_required
 def sync_bank_transactions():
-    """Sync transactions from Bank API"""
+    """Sync transactions from Bank API (in the background when JSON is requested)"""
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    
     try:
         # Get user's Wise API configuration
         wise_config = current_user.get_wise_config()
         
         if not wise_config['api_token']:
-            flash('Wise API token not configured. Please configure your API settings first.', 'error')
+            message = 'Wise API token not configured. Please configure your API settings first.'
+            if wants_json:
+                return jsonify({'status': 'error', 'message': message}), 400
+            flash(message, 'error')
             return redirect(url_for('settings.wise_settings'))
         
-        # Initialize Wise API service with user's settings
-        wise_service = WiseAPIService(
-            api_url=wise_config['api_url'],
-            api_token=wise_config['api_token'],
-            profile_id=wise_config['entity_number']
-        )
-        
-        # Fetch transactions from last 30 days
-        # Use logging instead of print statements for production
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.info("Bank sync initiated")
-        logger.debug(f"API URL configured: {bool(wise_config['api_url'])}")
-        logger.debug(f"Profile ID configured: {bool(wise_config['entity_number'])}")
-        logger.debug(f"Token configured: {bool(wise_config['api_token'])}")
-        logger.debug(f"Sandbox mode: {wise_config.get('is_sandbox', False)}")
-        
-        api_transactions = wise_service.get_transactions(days_back=30)
-        
-        logger.info(f"Received {len(api_transactions)} transactions")
-        if api_transactions:
-            logger.debug("Sample transaction structure received")
-        
-        new_transactions = 0
-        updated_transactions = 0
-        
-        for api_transaction in api_transactions:
-            transaction_date = datetime.strptime(api_transaction['date'], '%Y-%m-%d').date()
-            
-            # Use robust duplicate detection (user-filtered)
-            is_duplicate, existing_transaction, confidence = TransactionDeduplicator.is_duplicate(
-                date=transaction_date,
-                amount=api_transaction['amount'],
-                description=api_transaction['description'],
-                payment_reference=api_transaction.get('payment_reference', ''),
-                payee_name=api_transaction.get('payee_name', ''),
-                confidence_threshold=0.85,  # High confidence for bank sync
-                user_id=current_user.id
+        if wants_json:
+            job_id = background_jobs.start(
+                current_user.id, 'Error syncing transactions',
+                BankSyncService.sync_job, current_user.id, wise_config
             )
-            
-            if is_duplicate:
-                # Update existing transaction with any additional information
-                if api_transaction.get('payment_reference') and not existing_transaction.payment_reference:
-                    existing_transaction.payment_reference = api_transaction.get('payment_reference', '')
-                if api_transaction.get('payee_name') and not existing_transaction.payee_name:
-                    existing_transaction.payee_name = api_transaction.get('payee_name', '')
-                if api_transaction.get('merchant') and not existing_transaction.merchant:
-                    existing_transaction.merchant = api_transaction.get('merchant', '')
-                updated_transactions += 1
-            else:
-                # Create new transaction (with user_id)
-                transaction = Transaction(
-                    user_id=current_user.id,
-                    date=transaction_date,
-                    amount=api_transaction['amount'],
-                    currency=api_transaction['currency'],
-                    description=api_transaction['description'],
-                    payment_reference=api_transaction.get('payment_reference', ''),
-                    payee_name=api_transaction.get('payee_name', ''),
-                    merchant=api_transaction.get('merchant', '')
-                )
-                db.session.add(transaction)
-                new_transactions += 1
+            return jsonify({
+                'status': 'running',
+                'job_id': job_id,
+                'status_url': url_for('main.job_status', job_id=job_id)
+            }), 202
         
-        db.session.commit()
+        new_transactions, updated_transactions = BankSyncService.sync_user(current_user.id, wise_config)
         
         flash(f'Successfully synced! Added {new_transactions} new transactions, updated {updated_transactions}.', 'success')
         
@@ -174,6 +158,19 @@ def sync_bank_transactions():
     
     return redirect(url_for('main.dashboard'))
 
+@main_bp.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """Poll a background sync or import; its outcome is flashed for the next page load"""
+    job = background_jobs.get_job(job_id, current_user.id)
+    if job is None:
+        return jsonify({'status': 'not_found'}), 404
+    
+    for message, category in job['messages']:
+        flash(message, category)
+    
+    return jsonify({'status': job['status']})
+
 @main_bp.route('/upload-transactions', methods=['GET', 'POST'])
 @login_required
 def upload_transactions():
@@ -269,15 +266,22 @@ def handle_single_transaction_upload():
     return redirect(url_for('main.upload_transactions'))
 
 def handle_csv_upload():
-    """Handle CSV file upload for bulk transactions"""
+    """Handle CSV file upload for bulk transactions (imported in the background when JSON is requested)"""
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    
+    def upload_error(message):
+        flash(message, 'error')
+        if wants_json:
+            return jsonify({'status': 'error', 'message': message}), 400
+        return redirect(url_for('main.upload_transactions'))
+    
     try:
         logger.info("CSV upload handler started")
         
         # Check if file was uploaded
         if 'csv_file' not in request.files:
             logger.error("No csv_file in request.files")
-            flash('No CSV file selected.', 'error')
-            return redirect(url_for('main.upload_transactions'))
+            return upload_error('No CSV file selected.')
         
         file = request.files['csv_file']
         logger.info(f"Processing CSV file: {file.filename}")
@@ -290,151 +294,74 @@ def handle_csv_upload():
         )
         
         if not is_valid:
-            flash(f'File validation error: {error_message}', 'error')
-            return redirect(url_for('main.upload_transactions'))
+            return upload_error(f'File validation error: {error_message}')
         
         # Read and process CSV
         file.seek(0)  # Reset file pointer
-        content = file.read().decode('utf-8')
-        stream = io.StringIO(content)
-        csv_reader = csv.DictReader(stream)
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8', newline='')  # Decode while reading
+        # Blank lines are skipped, as csv.DictReader did
+        csv_reader = (row for row in csv.reader(stream) if row)
         
         # Validate CSV headers
         required_headers = ['date', 'description', 'amount']
         optional_headers = ['currency', 'payee_name', 'merchant', 'payment_reference']
         
-        fieldnames = csv_reader.fieldnames
+        fieldnames = next(csv_reader, None)
         logger.debug(f"CSV fieldnames found: {fieldnames}")
         
         if not fieldnames:
-            flash('CSV file appears to be empty or invalid format.', 'error')
-            return redirect(url_for('main.upload_transactions'))
+            return upload_error('CSV file appears to be empty or invalid format.')
         
         # Case-insensitive header check
         csv_headers_lower = [h.lower().strip() for h in fieldnames]
         missing_headers = [h for h in required_headers if h.lower() not in csv_headers_lower]
         
         if missing_headers:
-            flash(f'CSV must contain these required columns: {", ".join(missing_headers)}. Found: {", ".join(fieldnames)}', 'error')
-            return redirect(url_for('main.upload_transactions'))
-        
-        # Process transactions
-        new_transactions = 0
-        skipped_transactions = 0
-        errors = []
-        
-        logger.info("Starting CSV row processing...")
+            return upload_error(f'CSV must contain these required columns: {", ".join(missing_headers)}. Found: {", ".join(fieldnames)}')
+        
+        # Map each field to its column once (case-insensitive, last duplicate header wins);
+        # rows are read by position instead of building a dict per row
+        col_idx = {name: i for i, name in enumerate(csv_headers_lower)}
+        width = len(fieldnames)
+        field_defaults = {
+            'date': '', 'description': '', 'amount': '', 'currency': 'USD',
+            'payee_name': '', 'merchant': '', 'payment_reference': ''
+        }
+        field_columns = [(field, col_idx.get(field), default) for field, default in field_defaults.items()]
         
-        for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 for header row
-            try:
-                logger.debug(f"Processing row {row_num}")
+        def transaction_rows():
+            """Yield (row number, field dict) for each non-empty CSV row"""
+            for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 for header row
+                logger.debug("Processing row %d", row_num)  # Lazy: formatted only when DEBUG is on
                 
-                # Clean and extract data (case-insensitive)
-                row_data = {k.lower().strip(): v.strip() if v else '' for k, v in row.items()}
-                
-                # Skip empty rows
-                if not any(row_data.values()):
-                    logger.debug(f"Skipping empty row {row_num}")
+                # Skip empty rows (e.g. ",,,") before any per-field work
+                if not any(value.strip() for value in row):
+                    logger.debug("Skipping empty row %d", row_num)
                     continue
                 
-                # Prepare data for validation
-                transaction_data = {
-                    'date': row_data.get('date', ''),
-                    'description': row_data.get('description', ''),
-                    'amount': row_data.get('amount', ''),
-                    'currency': row_data.get('currency', 'USD'),
-                    'payee_name': row_data.get('payee_name', ''),
-                    'merchant': row_data.get('merchant', ''),
-                    'payment_reference': row_data.get('payment_reference', '')
-                }
-                
-                # Validate using the validation system
-                validated_data = InputValidator.validate_transaction_data(transaction_data)
-                
-                transaction_date = validated_data['date']
-                amount = validated_data['amount']
-                description = validated_data['description']
-                currency = validated_data['currency']
-                payee_name = validated_data['payee_name']
-                merchant = validated_data['merchant']
-                payment_reference = validated_data['payment_reference']
-                
-                # Use robust duplicate detection (user-filtered)
-                is_duplicate, existing_transaction, confidence = TransactionDeduplicator.is_duplicate(
-                    date=transaction_date,
-                    amount=amount,
-                    description=description,
-                    payment_reference=payment_reference,
-                    payee_name=payee_name,
-                    confidence_threshold=0.75,  # Lower threshold for CSV bulk import
-                    user_id=current_user.id
-                )
+                # Short rows are padded like DictReader's missing values; extra values are ignored
+                if len(row) < width:
+                    row += [''] * (width - len(row))
                 
-                if is_duplicate:
-                    skipped_transactions += 1
-                    continue
-                
-                # Create transaction (with user_id)
-                transaction = Transaction(
-                    user_id=current_user.id,
-                    date=transaction_date,
-                    amount=amount,
-                    currency=currency,
-                    description=description,
-                    payment_reference=payment_reference,
-                    payee_name=payee_name,
-                    merchant=merchant,
-                    status='unreconciled'
-                )
-                
-                logger.debug(f"Created transaction: {transaction.description}")
-                db.session.add(transaction)
-                new_transactions += 1
-                
-            except ValidationError as e:
-                errors.append(f"Row {row_num}: {str(e)}")
-            except ValueError as e:
-                errors.append(f"Row {row_num}: Invalid date or amount format")
-            except Exception as e:
-                errors.append(f"Row {row_num}: {str(e)}")
-        
-        # Commit successful transactions
-        logger.info(f"CSV import summary - New: {new_transactions}, Skipped: {skipped_transactions}, Errors: {len(errors)}")
-        
-        if new_transactions > 0:
-            try:
-                db.session.commit()
-                logger.info(f"Successfully committed {new_transactions} new transactions")
-                
-                # Verify transactions were actually saved
-                saved_count = Transaction.query.filter_by(user_id=current_user.id).count()
-                logger.debug(f"Total transactions in database for user: {saved_count}")
-                
-            except Exception as commit_error:
-                logger.error(f"Database commit failed: {commit_error}")
-                db.session.rollback()
-                flash(f'Database error: Failed to save transactions. {str(commit_error)}', 'error')
-                return redirect(url_for('main.upload_transactions'))
-        else:
-            logger.info("No new transactions to commit")
-        
-        # Show results
-        if new_transactions > 0:
-            flash(f'Successfully uploaded {new_transactions} new transactions!', 'success')
-        elif skipped_transactions > 0 and len(errors) == 0:
-            flash(f'No new transactions added - all {skipped_transactions} transactions were duplicates.', 'warning')
-        elif len(errors) == 0:
-            flash('No transactions found in CSV file.', 'warning')
-        
-        if skipped_transactions > 0:
-            flash(f'Skipped {skipped_transactions} duplicate transactions.', 'warning')
-        
-        if errors:
-            flash(f'Found {len(errors)} errors in CSV file. Check the format and try again.', 'error')
-            for error in errors[:5]:  # Show first 5 errors
-                flash(error, 'error')
-            if len(errors) > 5:
-                flash(f'... and {len(errors) - 5} more errors.', 'error')
+                yield row_num, {
+                    field: row[index].strip() if index is not None else default
+                    for field, index, default in field_columns
+                }
+        
+        if wants_json:
+            # The upload stream ends with the request, so the rows are read now and imported in the background
+            job_id = background_jobs.start(
+                current_user.id, 'Error processing CSV file',
+                CsvImportService.import_rows, current_user.id, list(transaction_rows())
+            )
+            return jsonify({
+                'status': 'running',
+                'job_id': job_id,
+                'status_url': url_for('main.job_status', job_id=job_id)
+            }), 202
+        
+        for message, category in CsvImportService.import_rows(current_user.id, transaction_rows()):
+            flash(message, category)
         
     except Exception as e:
         flash(f'Error processing CSV file: {str(e)}', 'error')
@@ -482,35 +409,19 @@ def mass_delete_transactions():
                 'message': 'Invalid transaction IDs provided'
             })
         
-        # Query transactions that belong to the current user
-        transactions = Transaction.query.filter(
-            Transaction.id.in_(transaction_ids),
-            Transaction.user_id == current_user.id
-        ).all()
+        # Delete the user's transactions, their codes and documents in bulk
+        deleted_count, file_paths = Transaction.bulk_delete(current_user.id, transaction_ids)
         
-        if not transactions:
+        if not deleted_count:
             return jsonify({
                 'success': False,
                 'message': 'No valid transactions found for deletion'
             })
         
-        # Delete associated documents first
-        deleted_count = 0
-        for transaction in transactions:
-            # Delete associated documents
-            for document in transaction.documents:
-                try:
-                    if os.path.exists(document.file_path):
-                        os.remove(document.file_path)
-                except OSError:
-                    pass  # Continue even if file deletion fails
-            
-            # Delete the transaction (cascade will handle documents and transaction_codes)
-            db.session.delete(transaction)
-            deleted_count += 1
-        
-        # Commit all deletions
+        # Commit all deletions, then remove the files they referenced without holding up the response
         db.session.commit()
+        if file_paths:
+            background_jobs.run_later(FileService.delete_files, file_paths)
         
         return jsonify({
             'success': True,
@@ -543,7 +454,9 @@ def test_delete():
 @main_bp.route('/health')
 def health_check():
     """Health check endpoint for Railway"""
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now(timezone.utc).isoformat()})
+    # Probed constantly, so the fixed-shape body is formatted directly instead of going through jsonify
+    timestamp = datetime.now(timezone.utc).isoformat()
+    return Response(f'{{"status": "healthy", "timestamp": "{timestamp}"}}\n', mimetype='application/json')
 
 @main_bp.route('/debug-db')
 @login_required
@@ -551,8 +464,10 @@ def debug_database():
     """Debug endpoint to test database connectivity and user transactions"""
     try:
         # Test database connection
-        total_transactions = Transaction.query.count()
-        user_transactions = Transaction.query.filter_by(user_id=current_user.id).count()
+        total_transactions = db.session.scalar(db.select(db.func.count(Transaction.id)))
+        user_transactions = db.session.scalar(
+            db.select(db.func.count(Transaction.id)).where(Transaction.user_id == current_user.id)
+        )
         
         # Test creating a simple transaction
         test_transaction = Transaction(
@@ -568,7 +483,9 @@ def debug_database():
         db.session.commit()
         
         # Count again after adding
-        new_user_transactions = Transaction.query.filter_by(user_id=current_user.id).count()
+        new_user_transactions = db.session.scalar(
+            db.select(db.func.count(Transaction.id)).where(Transaction.user_id == current_user.id)
+        )
         
         # Clean up test transaction
         db.session.delete(test_transaction)
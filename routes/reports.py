@@ -1,15 +1,88 @@
-from flask import Blueprint, render_template, request, send_file, flash, redirect, url_for
+from flask import Blueprint, Response, render_template, request, flash, redirect, url_for, stream_with_context
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
-import os
-import tempfile
+import io
+import logging
+from itertools import chain
 import csv
 import zipfile
-import shutil
+from sqlalchemy import func
 from models import db, Transaction, TransactionCode
 
 reports_bp = Blueprint('reports', __name__)
 
+logger = logging.getLogger(__name__)
+
+REPORT_PAGE_SIZE = 50  # Transactions listed per page on the reports page
+EXPORT_BATCH_SIZE = 1000  # Rows fetched per round trip while exporting
+EXPORT_CHUNK_SIZE = 64 * 1024  # Bytes buffered or read before each write to the client
+
+def _csv_chunks(rows):
+    """Encode CSV rows into chunks of about EXPORT_CHUNK_SIZE for a streaming response"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, unseekable target for zipfile; the streaming export drains it after each write"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        """Return and forget everything written since the last drain"""
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _currency_totals(user_id, start_date, end_date, first_seen):
+    """
+    Sum revenue and expenses per currency in the database for a date range.
+    Currencies come back in the order the rows sorted by first_seen would reach them
+    """
+    grouped_totals = db.session.execute(
+        db.select(
+            Transaction.currency,
+            TransactionCode.category_name,
+            func.sum(Transaction.amount),
+            func.sum(func.abs(Transaction.amount, type_=Transaction.amount.type))
+        ).join_from(Transaction, TransactionCode).filter(
+            Transaction.user_id == user_id,
+            Transaction.date >= start_date,
+            Transaction.date < end_date + timedelta(days=1)
+        ).group_by(
+            Transaction.currency, TransactionCode.category_name
+        ).order_by(first_seen)
+    ).all()
+    
+    currency_totals = {}
+    for currency, category_name, amount_sum, abs_amount_sum in grouped_totals:
+        currency = currency or 'USD'  # Default to USD if no currency
+        
+        if currency not in currency_totals:
+            currency_totals[currency] = {'revenue': 0, 'expense': 0}
+        
+        if category_name == 'Revenue':
+            currency_totals[currency]['revenue'] += amount_sum
+        elif category_name == 'Expense':
+            currency_totals[currency]['expense'] += abs_amount_sum  # Make expenses positive
+    
+    return currency_totals
+
 @reports_bp.route('/reports')
 @login_required
 def reports():
@@ -32,28 +105,22 @@ def reports():
         start_date = default_start.date()
         end_date = default_end.date()
     
-    # Get coded transactions in date range (user-filtered)
+    # Get one page of coded transactions in date range (user-filtered)
+    page = request.args.get('page', 1, type=int)
     coded_transactions = db.session.query(Transaction, TransactionCode).join(
         TransactionCode
     ).filter(
         Transaction.user_id == current_user.id,
         Transaction.date >= start_date,
-        Transaction.date <= end_date
-    ).order_by(Transaction.date.desc()).all()
+        Transaction.date < end_date + timedelta(days=1)
+    ).order_by(Transaction.date.desc()).paginate(
+        page=page, per_page=REPORT_PAGE_SIZE, error_out=False
+    )
     
-    # Calculate totals by currency
-    currency_totals = {}
-    
-    for transaction, code in coded_transactions:
-        currency = transaction.currency or 'USD'  # Default to USD if no currency
-        
-        if currency not in currency_totals:
-            currency_totals[currency] = {'revenue': 0, 'expense': 0}
-        
-        if code.category_name == 'Revenue':
-            currency_totals[currency]['revenue'] += transaction.amount
-        elif code.category_name == 'Expense':
-            currency_totals[currency]['expense'] += abs(transaction.amount)  # Make expenses positive
+    # Totals cover the whole range, newest currency first as the listing shows them
+    currency_totals = _currency_totals(
+        current_user.id, start_date, end_date, func.max(Transaction.date).desc()
+    )
     
     # For backward compatibility, calculate totals in primary currency (first currency found or USD)
     primary_currency = next(iter(currency_totals.keys())) if currency_totals else 'USD'
@@ -64,7 +131,8 @@ def reports():
     
     # Prepare data for template
     report_data = {
-        'transactions': coded_transactions,
+        'transactions': coded_transactions.items,
+        'pagination': coded_transactions,
         'revenue_total': revenue_total,
         'expense_total': expense_total,
         'net_profit': profit,
@@ -72,7 +140,7 @@ def reports():
         'primary_currency': primary_currency,
         'start_date': start_date,
         'end_date': end_date,
-        'total_transactions': len(coded_transactions)
+        'total_transactions': coded_transactions.total
     }
     
     return render_template('reports.html', 
@@ -96,36 +164,34 @@ def export_csv():
         flash('Invalid date range for export', 'error')
         return redirect(url_for('reports.reports'))
     
-    # Get coded transactions in date range (user-filtered)
-    coded_transactions = db.session.query(Transaction, TransactionCode).join(
+    # Get coded transactions in date range (user-filtered), fetched in batches while streaming
+    coded_transactions = iter(db.session.query(Transaction, TransactionCode).join(
         TransactionCode
     ).filter(
         Transaction.user_id == current_user.id,
         Transaction.date >= start_date,
-        Transaction.date <= end_date
-    ).order_by(Transaction.date.asc()).all()
+        Transaction.date < end_date + timedelta(days=1)
+    ).order_by(Transaction.date.asc()).yield_per(EXPORT_BATCH_SIZE))
     
-    if not coded_transactions:
+    first_row = next(coded_transactions, None)
+    if first_row is None:
         flash('No coded transactions found in the selected date range', 'warning')
         return redirect(url_for('reports.reports'))
     
-    # Create temporary file
-    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv', newline='') as tmp_file:
-        writer = csv.writer(tmp_file)
-        
+    def csv_rows():
         # Write header
-        writer.writerow([
+        yield [
             'Date', 'Description', 'Amount', 'Currency', 'Category',
             'Payee Name', 'Merchant', 'Payment Reference', 'Notes', 'Documents'
-        ])
+        ]
         
         # Write data
-        for transaction, code in coded_transactions:
+        for transaction, code in chain([first_row], coded_transactions):
             # Get document filenames
             document_names = [doc.filename for doc in transaction.documents]
             documents_str = '; '.join(document_names) if document_names else 'No documents'
             
-            writer.writerow([
+            yield [
                 transaction.date.strftime('%Y-%m-%d'),
                 transaction.description,
                 transaction.amount,
@@ -136,17 +202,17 @@ def export_csv():
                 transaction.payment_reference or '',
                 code.notes or '',
                 documents_str
-            ])
-        
-        # Generate filename
-        filename = f"bookkeeping_report_{start_date_str}_to_{end_date_str}.csv"
-        
-        return send_file(
-            tmp_file.name,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='text/csv'
-        )
+            ]
+    
+    # Generate filename
+    filename = f"bookkeeping_report_{start_date_str}_to_{end_date_str}.csv"
+    
+    # Stream straight to the client; the request context (and session) lives until the last row
+    return Response(
+        stream_with_context(_csv_chunks(csv_rows())),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
 
 @reports_bp.route('/export/complete')
 @login_required
@@ -164,63 +230,69 @@ def export_complete():
         flash('Invalid date range for export', 'error')
         return redirect(url_for('reports.reports'))
     
-    # Get coded transactions in date range (user-filtered)
-    coded_transactions = db.session.query(Transaction, TransactionCode).join(
+    # Get coded transactions in date range (user-filtered), fetched in batches
+    coded_transactions = iter(db.session.query(Transaction, TransactionCode).join(
         TransactionCode
     ).filter(
         Transaction.user_id == current_user.id,
         Transaction.date >= start_date,
-        Transaction.date <= end_date
-    ).order_by(Transaction.date.asc()).all()
+        Transaction.date < end_date + timedelta(days=1)
+    ).order_by(Transaction.date.asc()).yield_per(EXPORT_BATCH_SIZE))
     
-    if not coded_transactions:
+    first_row = next(coded_transactions, None)
+    if first_row is None:
         flash('No reconciled transactions found in the selected date range', 'warning')
         return redirect(url_for('reports.reports'))
     
-    # Create temporary directory for organizing files
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Create CSV file
-        csv_filename = f"transactions_{start_date_str}_to_{end_date_str}.csv"
-        csv_path = os.path.join(temp_dir, csv_filename)
+    csv_filename = f"transactions_{start_date_str}_to_{end_date_str}.csv"
+    summary_filename = f"summary_{start_date_str}_to_{end_date_str}.txt"
+    user_id = current_user.id
+    
+    def zip_chunks():
+        # Counts and document paths are collected in the same pass that writes the CSV
+        total_transactions = 0
+        total_documents = 0
+        documents = []  # (source path, name in the ZIP)
+        unreadable_documents = []  # Listed in the CSV but unreadable once the ZIP got to them
         
-        with open(csv_path, 'w', newline='', encoding='utf-8') as csv_file:
-            writer = csv.writer(csv_file)
+        def csv_rows():
+            nonlocal total_transactions, total_documents
             
             # Write header
-            writer.writerow([
+            yield [
                 'Date', 'Description', 'Amount', 'Currency', 'Category',
                 'Payee Name', 'Merchant', 'Payment Reference', 'Notes', 
                 'Document Files', 'Document Count'
-            ])
-            
-            # Write data and collect document info
-            documents_dir = os.path.join(temp_dir, 'documents')
-            os.makedirs(documents_dir, exist_ok=True)
+            ]
             
-            for transaction, code in coded_transactions:
+            for transaction, code in chain([first_row], coded_transactions):
+                total_transactions += 1
+                total_documents += len(transaction.documents)
+                
                 # Get document filenames
                 document_names = []
                 document_count = 0
                 
                 for doc in transaction.documents:
-                    if os.path.exists(doc.file_path):
-                        # Create a unique filename for the ZIP
-                        file_extension = os.path.splitext(doc.filename)[1]
-                        unique_filename = f"T{transaction.id}_{doc.id}_{doc.filename}"
-                        
-                        # Copy document to temp directory
-                        dest_path = os.path.join(documents_dir, unique_filename)
-                        try:
-                            shutil.copy2(doc.file_path, dest_path)
-                            document_names.append(unique_filename)
-                            document_count += 1
-                        except Exception as e:
-                            print(f"Error copying file {doc.file_path}: {e}")
-                            document_names.append(f"ERROR: {doc.filename}")
+                    # Check each file opens now, so the CSV only lists what the ZIP will contain
+                    try:
+                        open(doc.file_path, 'rb').close()
+                    except FileNotFoundError:
+                        continue
+                    except OSError as e:
+                        logger.error(f"Error reading file {doc.file_path}: {e}")
+                        document_names.append(f"ERROR: {doc.filename}")
+                        continue
+                    
+                    # Create a unique filename for the ZIP
+                    unique_filename = f"T{transaction.id}_{doc.id}_{doc.filename}"
+                    documents.append((doc.file_path, f"documents/{unique_filename}"))
+                    document_names.append(unique_filename)
+                    document_count += 1
                 
                 documents_str = '; '.join(document_names) if document_names else 'No documents'
                 
-                writer.writerow([
+                yield [
                     transaction.date.strftime('%Y-%m-%d'),
                     transaction.description,
                     transaction.amount,
@@ -232,32 +304,48 @@ def export_complete():
                     code.notes or '',
                     documents_str,
                     document_count
-                ])
+                ]
         
-        # Create summary file
-        summary_filename = f"summary_{start_date_str}_to_{end_date_str}.txt"
-        summary_path = os.path.join(temp_dir, summary_filename)
-        
-        # Calculate totals by currency
-        currency_totals = {}
-        for t, c in coded_transactions:
-            currency = t.currency or 'USD'
-            if currency not in currency_totals:
-                currency_totals[currency] = {'revenue': 0, 'expense': 0}
+        sink = _ZipSink()
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            # Add CSV file, compressed as it is written
+            with zipf.open(csv_filename, 'w') as csv_entry:
+                for chunk in _csv_chunks(csv_rows()):
+                    csv_entry.write(chunk.encode('utf-8'))
+                    yield sink.drain()
             
-            if c.category_name == 'Revenue':
-                currency_totals[currency]['revenue'] += t.amount
-            elif c.category_name == 'Expense':
-                currency_totals[currency]['expense'] += abs(t.amount)
-        
-        # Use primary currency for summary (first currency found or USD)
-        primary_currency = next(iter(currency_totals.keys())) if currency_totals else 'USD'
-        revenue_total = currency_totals.get(primary_currency, {}).get('revenue', 0)
-        expense_total = currency_totals.get(primary_currency, {}).get('expense', 0)
-        profit = revenue_total - expense_total
-        total_documents = sum(len(t.documents) for t, c in coded_transactions)
-        
-        with open(summary_path, 'w', encoding='utf-8') as summary_file:
+            # Add all documents, read straight from storage a chunk at a time. They are PDFs,
+            # already compressed internally, so they are stored rather than deflated again
+            for file_path, arcname in documents:
+                try:
+                    source = open(file_path, 'rb')
+                except OSError as e:
+                    # Removed or locked since the CSV listed it; the summary says so
+                    logger.error(f"Error reading file {file_path}: {e}")
+                    unreadable_documents.append(arcname)
+                    continue
+                
+                with source:
+                    zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+                    zinfo.compress_type = zipfile.ZIP_STORED
+                    with zipf.open(zinfo, 'w') as document_entry:
+                        for chunk in iter(lambda: source.read(EXPORT_CHUNK_SIZE), b''):
+                            document_entry.write(chunk)
+                            yield sink.drain()
+            
+            # Sum per currency in the database, oldest currency first as the CSV lists them
+            currency_totals = _currency_totals(
+                user_id, start_date, end_date, func.min(Transaction.date)
+            )
+            
+            # Use primary currency for summary (first currency found or USD)
+            primary_currency = next(iter(currency_totals.keys())) if currency_totals else 'USD'
+            revenue_total = currency_totals.get(primary_currency, {}).get('revenue', 0)
+            expense_total = currency_totals.get(primary_currency, {}).get('expense', 0)
+            profit = revenue_total - expense_total
+            
+            # Add summary file last, so it can report documents that could not be added
+            summary_file = io.StringIO()
             summary_file.write(f"Bookkeeping Export Summary\n")
             summary_file.write(f"========================\n\n")
             summary_file.write(f"Export Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
@@ -275,34 +363,27 @@ def export_complete():
             summary_file.write(f"- Total Expenses: {primary_currency} {expense_total:.2f}\n")
             summary_file.write(f"- Profit: {primary_currency} {profit:.2f}\n\n")
             summary_file.write(f"Transaction Details:\n")
-            summary_file.write(f"- Total Transactions: {len(coded_transactions)}\n")
+            summary_file.write(f"- Total Transactions: {total_transactions}\n")
             summary_file.write(f"- Total Documents: {total_documents}\n\n")
             summary_file.write(f"Files Included:\n")
             summary_file.write(f"- {csv_filename} (transaction data)\n")
             summary_file.write(f"- documents/ folder (all PDF invoices/receipts)\n")
             summary_file.write(f"- {summary_filename} (this summary)\n")
+            if unreadable_documents:
+                summary_file.write(f"\nDocuments listed in the CSV that could not be read:\n")
+                for arcname in unreadable_documents:
+                    summary_file.write(f"- {arcname}\n")
+            zipf.writestr(summary_filename, summary_file.getvalue())
+            yield sink.drain()
         
-        # Create ZIP file
-        zip_filename = f"bookkeeping_complete_{start_date_str}_to_{end_date_str}.zip"
-        zip_path = os.path.join(tempfile.gettempdir(), zip_filename)
-        
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Add CSV file
-            zipf.write(csv_path, csv_filename)
-            
-            # Add summary file
-            zipf.write(summary_path, summary_filename)
-            
-            # Add all documents
-            if os.path.exists(documents_dir):
-                for filename in os.listdir(documents_dir):
-                    file_path = os.path.join(documents_dir, filename)
-                    if os.path.isfile(file_path):
-                        zipf.write(file_path, f"documents/{filename}")
-        
-        return send_file(
-            zip_path,
-            as_attachment=True,
-            download_name=zip_filename,
-            mimetype='application/zip'
-        )
\ No newline at end of file
+        # Closing the archive writes its central directory
+        yield sink.drain()
+    
+    zip_filename = f"bookkeeping_complete_{start_date_str}_to_{end_date_str}.zip"
+    
+    # Stream straight to the client, nothing staged on disk; skip writes the compressor buffered
+    return Response(
+        stream_with_context(filter(None, zip_chunks())),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{zip_filename}"'}
+    )
@@ -7,6 +7,15 @@ import re
 
 settings_bp = Blueprint('settings', __name__)
 
+# Basic API URL check, compiled once at import
+API_URL_PATTERN = re.compile(
+    r'^https?://'  # http:// or https://
+    r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain...
+    r'localhost|'  # localhost...
+    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # ...or ip
+    r'(?::\d+)?'  # optional port
+    r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+
 @settings_bp.route('/settings')
 @login_required
 def settings():
@@ -45,15 +54,7 @@ def save_wise_settings():
             return redirect(url_for('settings.settings'))
         
         # Basic URL validation
-        url_pattern = re.compile(
-            r'^https?://'  # http:// or https://
-            r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain...
-            r'localhost|'  # localhost...
-            r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # ...or ip
-            r'(?::\d+)?'  # optional port
-            r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-        
-        if not url_pattern.match(api_url):
+        if not API_URL_PATTERN.match(api_url):
             flash('Please enter a valid API URL (must start with http:// or https://)', 'error')
             return redirect(url_for('settings.settings'))
         
@@ -71,10 +72,7 @@ def save_wise_settings():
             return redirect(url_for('settings.settings'))
         
         # Save configuration for current user
-        AppSettings.set_user_setting(current_user.id, 'WISE_API_URL', api_url)
-        AppSettings.set_user_setting(current_user.id, 'WISE_API_TOKEN', api_token)
-        AppSettings.set_user_setting(current_user.id, 'WISE_ENTITY_NUMBER', entity_number)
-        AppSettings.set_user_setting(current_user.id, 'WISE_SANDBOX_MODE', is_sandbox)
+        AppSettings.set_user_wise_config(current_user.id, api_url, api_token, entity_number, is_sandbox)
         
         flash('Wise API settings saved successfully!', 'success')
         
@@ -130,10 +128,7 @@ def test_wise_connection():
 def clear_wise_settings():
     """Clear Wise API configuration"""
     try:
-        AppSettings.set_user_setting(current_user.id, 'WISE_API_URL', 'https://api.wise.com')
-        AppSettings.set_user_setting(current_user.id, 'WISE_API_TOKEN', '')
-        AppSettings.set_user_setting(current_user.id, 'WISE_ENTITY_NUMBER', '')
-        AppSettings.set_user_setting(current_user.id, 'WISE_SANDBOX_MODE', False)
+        AppSettings.set_user_wise_config(current_user.id, 'https://api.wise.com', '', '', False)
         
         flash('Wise API settings cleared successfully!', 'success')
         
@@ -1,9 +1,10 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, send_file
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 from models import db, Transaction, Document, TransactionCode
+from services import background_jobs
 from services.file_service import FileService
 from config import Config
 from utils.transaction_deduplication import TransactionDeduplicator
@@ -107,7 +108,7 @@ def list_transactions():
             query = query.filter(Transaction.date >= start_date_obj)
                 
         if end_date_obj:
-            query = query.filter(Transaction.date <= end_date_obj)
+            query = query.filter(Transaction.date < end_date_obj + timedelta(days=1))
         
         # Apply global search query
         if search_query:
@@ -124,6 +125,10 @@ def list_transactions():
         page = request.args.get('page', 1, type=int)
         per_page = 50  # Show 50 transactions per page
         
+        # Every branch above joins TransactionCode, so fill the status
+        # relationship from that join instead of per-row lazy loads
+        query = query.options(db.contains_eager(Transaction.transaction_code))
+        
         # Order by date (newest first) and paginate
         transactions = query.order_by(Transaction.date.desc()).paginate(
             page=page, per_page=per_page, error_out=False
@@ -501,35 +506,19 @@ def mass_delete_transactions():
                 'message': 'Invalid transaction IDs provided'
             })
         
-        # Query transactions that belong to the current user
-        transactions = Transaction.query.filter(
-            Transaction.id.in_(transaction_ids),
-            Transaction.user_id == current_user.id
-        ).all()
+        # Delete the user's transactions, their codes and documents in bulk
+        deleted_count, file_paths = Transaction.bulk_delete(current_user.id, transaction_ids)
         
-        if not transactions:
+        if not deleted_count:
             return jsonify({
                 'success': False,
                 'message': 'No valid transactions found for deletion'
             })
         
-        # Delete associated documents first
-        deleted_count = 0
-        for transaction in transactions:
-            # Delete associated documents
-            for document in transaction.documents:
-                try:
-                    if os.path.exists(document.file_path):
-                        os.remove(document.file_path)
-                except OSError:
-                    pass  # Continue even if file deletion fails
-            
-            # Delete the transaction (cascade will handle documents and transaction_codes)
-            db.session.delete(transaction)
-            deleted_count += 1
-        
-        # Commit all deletions
+        # Commit all deletions, then remove the files they referenced without holding up the response
         db.session.commit()
+        if file_paths:
+            background_jobs.run_later(FileService.delete_files, file_paths)
         
         return jsonify({
             'success': True,
@@ -0,0 +1,96 @@
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from models import db, BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Long-running imports run here so the request that starts one returns immediately
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='background-job')
+
+# Job state lives in the background_job table so a job started by one gunicorn worker
+# can be polled from any other. Rows are purged when a new job starts:
+FINISHED_JOB_TTL = timedelta(hours=1)  # Finished jobs nobody polled
+STALE_JOB_TTL = timedelta(hours=24)  # Running jobs whose worker exited before finishing them
+
+def start(user_id: int, error_message: str, func, *args) -> str:
+    """
+    Run func(*args) on the background pool inside an app context and return a job ID.
+    func returns the (message, category) pairs to flash when the user next polls the job;
+    if it raises, the job fails with f'{error_message}: {error}'.
+    """
+    _purge_expired_jobs()
+
+    job_id = uuid.uuid4().hex
+    db.session.add(BackgroundJob(id=job_id, user_id=user_id, status='running', messages=[]))
+    db.session.commit()  # Visible to every worker before the client can poll it
+
+    app = current_app._get_current_object()
+    _pool.submit(_run_job, app, job_id, error_message, func, args)
+    return job_id
+
+def run_later(func, *args):
+    """Fire-and-forget func(*args) on the background pool, for work nobody polls (no app context)"""
+    future = _pool.submit(func, *args)
+    future.add_done_callback(_log_failure)
+
+def _log_failure(future):
+    """Done callback for run_later: nothing else would see the exception"""
+    if future.exception() is not None:
+        logger.error(f"Background task failed: {future.exception()}")
+
+def _run_job(app, job_id: str, error_message: str, func, args):
+    """Background worker: run the job in its own app context and record the outcome"""
+    with app.app_context():
+        try:
+            status, messages = 'finished', func(*args)
+        except Exception as e:
+            logger.error(f"Background job failed: {e}")
+            db.session.rollback()
+            status, messages = 'failed', [(f'{error_message}: {str(e)}', 'error')]
+
+        try:
+            db.session.execute(
+                db.update(BackgroundJob).where(BackgroundJob.id == job_id).values(
+                    status=status,
+                    messages=[list(message) for message in messages],
+                    finished_at=datetime.now(timezone.utc)
+                )
+            )
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Could not record background job result: {e}")
+            db.session.rollback()
+
+def _purge_expired_jobs():
+    """Delete finished jobs past FINISHED_JOB_TTL and running ones past STALE_JOB_TTL"""
+    now = datetime.now(timezone.utc)
+    db.session.execute(
+        db.delete(BackgroundJob).where(db.or_(
+            BackgroundJob.finished_at < now - FINISHED_JOB_TTL,
+            BackgroundJob.created_at < now - STALE_JOB_TTL
+        ))
+    )
+
+def get_job(job_id: str, user_id: int):
+    """
+    Return the user's job as a dict with its status and messages, or None.
+    Finished jobs are forgotten once read
+    """
+    job = db.session.execute(
+        db.select(BackgroundJob.status, BackgroundJob.messages).where(
+            BackgroundJob.id == job_id, BackgroundJob.user_id == user_id
+        )
+    ).one_or_none()
+    if job is None:
+        return None
+
+    if job.status != 'running':
+        # Only the poll whose delete removes the row reports the result, so it is flashed once
+        deleted = db.session.execute(db.delete(BackgroundJob).where(BackgroundJob.id == job_id))
+        db.session.commit()
+        if deleted.rowcount == 0:
+            return None
+    return {'status': job.status, 'messages': job.messages}
@@ -0,0 +1,104 @@
+import logging
+from datetime import date
+from types import SimpleNamespace
+from models import db, Transaction
+from services.wise_api import WiseAPIService
+from utils.transaction_deduplication import TransactionDeduplicator
+
+logger = logging.getLogger(__name__)
+
+class BankSyncService:
+    @staticmethod
+    def sync_user(user_id: int, wise_config: dict) -> tuple:
+        """
+        Import the last 30 days of bank transactions for a user and commit them.
+        Returns (new_transactions, updated_transactions)
+        """
+        # Initialize Wise API service with user's settings
+        wise_service = WiseAPIService(
+            api_url=wise_config['api_url'],
+            api_token=wise_config['api_token'],
+            profile_id=wise_config['entity_number']
+        )
+
+        logger.info("Bank sync initiated")
+        logger.debug(f"API URL configured: {bool(wise_config['api_url'])}")
+        logger.debug(f"Profile ID configured: {bool(wise_config['entity_number'])}")
+        logger.debug(f"Token configured: {bool(wise_config['api_token'])}")
+        logger.debug(f"Sandbox mode: {wise_config.get('is_sandbox', False)}")
+
+        # Fetch transactions from last 30 days
+        api_transactions = wise_service.get_transactions(days_back=30)
+
+        logger.info(f"Received {len(api_transactions)} transactions")
+        if api_transactions:
+            logger.debug("Sample transaction structure received")
+
+        new_transactions = 0
+        updated_transactions = 0
+        pending_rows = []  # Inserted in bulk after the loop
+        pending_updates = []  # Fill-ins for existing rows, applied in bulk after the loop
+
+        # Load the duplicate candidates for the whole sync window in one query
+        transaction_dates = [
+            date.fromisoformat(api_transaction['date'])
+            for api_transaction in api_transactions
+        ]
+        duplicate_index = TransactionDeduplicator.build_index(user_id, transaction_dates)
+
+        for api_transaction, transaction_date in zip(api_transactions, transaction_dates):
+            # Use robust duplicate detection (user-filtered)
+            is_duplicate, existing_transaction, confidence = TransactionDeduplicator.is_duplicate(
+                date=transaction_date,
+                amount=api_transaction['amount'],
+                description=api_transaction['description'],
+                payment_reference=api_transaction.get('payment_reference', ''),
+                payee_name=api_transaction.get('payee_name', ''),
+                confidence_threshold=0.85,  # High confidence for bank sync
+                user_id=user_id,
+                index=duplicate_index
+            )
+
+            if is_duplicate:
+                # Fill in any additional information the existing transaction lacks
+                fill_ins = {
+                    'payment_reference': api_transaction.get('payment_reference') or None,
+                    'payee_name': api_transaction.get('payee_name') or None,
+                    'merchant': api_transaction.get('merchant') or None
+                }
+                if isinstance(existing_transaction, Transaction):
+                    pending_updates.append({'id': existing_transaction.id, **fill_ins})
+                else:
+                    # Matched a row queued earlier in this sync; patch it before it is inserted
+                    for name, value in fill_ins.items():
+                        if value and not getattr(existing_transaction, name):
+                            setattr(existing_transaction, name, value)
+                updated_transactions += 1
+            else:
+                # Queue new transaction (with user_id)
+                row = SimpleNamespace(
+                    user_id=user_id,
+                    date=transaction_date,
+                    amount=api_transaction['amount'],
+                    currency=api_transaction['currency'],
+                    description=api_transaction['description'],
+                    payment_reference=api_transaction.get('payment_reference', ''),
+                    payee_name=api_transaction.get('payee_name', ''),
+                    merchant=api_transaction.get('merchant', '')
+                )
+                pending_rows.append(row)
+                duplicate_index.add(row)
+                new_transactions += 1
+
+        # Fill-ins are one COALESCE UPDATE per chunk; new rows go in as multi-row INSERTs
+        Transaction.bulk_fill_missing(pending_updates)
+        Transaction.bulk_insert([vars(row) for row in pending_rows])
+        db.session.commit()
+
+        return new_transactions, updated_transactions
+
+    @staticmethod
+    def sync_job(user_id: int, wise_config: dict) -> list:
+        """Background job body: sync and return the flash messages for the result"""
+        new_transactions, updated_transactions = BankSyncService.sync_user(user_id, wise_config)
+        return [(f'Successfully synced! Added {new_transactions} new transactions, updated {updated_transactions}.', 'success')]
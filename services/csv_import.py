@@ -0,0 +1,134 @@
+import logging
+from itertools import islice
+from types import SimpleNamespace
+from models import db, Transaction
+from utils.transaction_deduplication import TransactionDeduplicator
+from utils.validation import InputValidator
+
+logger = logging.getLogger(__name__)
+
+class CsvImportService:
+    @staticmethod
+    def import_rows(user_id: int, rows) -> list:
+        """
+        Validate, deduplicate and insert parsed CSV rows for a user, then commit.
+        rows is an iterable of (row number, field dict); returns the (message, category)
+        pairs describing the result
+        """
+        new_transactions = 0
+        skipped_transactions = 0
+
+        logger.info("Starting CSV row processing...")
+
+        # Validate, deduplicate and insert one batch at a time so memory stays flat for
+        # large files; each batch is inserted before the next loads its duplicate candidates
+        rows = iter(rows)
+        errors = []
+        while True:
+            # Validate using the validation system
+            validated_rows, batch_errors = InputValidator.validate_rows(
+                islice(rows, Transaction.BULK_INSERT_CHUNK_SIZE)
+            )
+            if not validated_rows and not batch_errors:
+                break
+            errors.extend(batch_errors)
+
+            # Load the duplicate candidates for every date in the batch in one query
+            duplicate_index = TransactionDeduplicator.build_index(
+                user_id, [validated_data['date'] for validated_data in validated_rows]
+            )
+            pending_rows = []
+
+            for validated_data in validated_rows:
+                transaction_date = validated_data['date']
+                amount = validated_data['amount']
+                description = validated_data['description']
+                currency = validated_data['currency']
+                payee_name = validated_data['payee_name']
+                merchant = validated_data['merchant']
+                payment_reference = validated_data['payment_reference']
+
+                # Re-imported rows match exactly; that alone reaches the 0.75 threshold below,
+                # so fuzzy scoring is only needed when the exact lookup misses
+                if duplicate_index.contains_exact(transaction_date, amount, description):
+                    skipped_transactions += 1
+                    continue
+
+                # Use robust duplicate detection (user-filtered)
+                is_duplicate, existing_transaction, confidence = TransactionDeduplicator.is_duplicate(
+                    date=transaction_date,
+                    amount=amount,
+                    description=description,
+                    payment_reference=payment_reference,
+                    payee_name=payee_name,
+                    confidence_threshold=0.75,  # Lower threshold for CSV bulk import
+                    user_id=user_id,
+                    index=duplicate_index
+                )
+
+                if is_duplicate:
+                    skipped_transactions += 1
+                    continue
+
+                # Queue transaction (with user_id)
+                row = SimpleNamespace(
+                    user_id=user_id,
+                    date=transaction_date,
+                    amount=amount,
+                    currency=currency,
+                    description=description,
+                    payment_reference=payment_reference,
+                    payee_name=payee_name,
+                    merchant=merchant,
+                    status='unreconciled'
+                )
+                pending_rows.append(row)
+                duplicate_index.add(row)
+
+                logger.debug("Queued transaction: %s", description)  # Lazy: formatted only when DEBUG is on
+                new_transactions += 1
+
+            Transaction.bulk_insert([vars(row) for row in pending_rows])
+
+        # Commit successful transactions
+        logger.info(f"CSV import summary - New: {new_transactions}, Skipped: {skipped_transactions}, Errors: {len(errors)}")
+
+        if new_transactions > 0:
+            try:
+                db.session.commit()
+                logger.info(f"Successfully committed {new_transactions} new transactions")
+
+                # Verify transactions were actually saved
+                if logger.isEnabledFor(logging.DEBUG):
+                    saved_count = db.session.scalar(
+                        db.select(db.func.count(Transaction.id)).where(Transaction.user_id == user_id)
+                    )
+                    logger.debug(f"Total transactions in database for user: {saved_count}")
+
+            except Exception as commit_error:
+                logger.error(f"Database commit failed: {commit_error}")
+                db.session.rollback()
+                return [(f'Database error: Failed to save transactions. {str(commit_error)}', 'error')]
+        else:
+            logger.info("No new transactions to commit")
+
+        # Describe the results
+        messages = []
+        if new_transactions > 0:
+            messages.append((f'Successfully uploaded {new_transactions} new transactions!', 'success'))
+        elif skipped_transactions > 0 and len(errors) == 0:
+            messages.append((f'No new transactions added - all {skipped_transactions} transactions were duplicates.', 'warning'))
+        elif len(errors) == 0:
+            messages.append(('No transactions found in CSV file.', 'warning'))
+
+        if skipped_transactions > 0:
+            messages.append((f'Skipped {skipped_transactions} duplicate transactions.', 'warning'))
+
+        if errors:
+            messages.append((f'Found {len(errors)} errors in CSV file. Check the format and try again.', 'error'))
+            for error in errors[:5]:  # Show first 5 errors
+                messages.append((error, 'error'))
+            if len(errors) > 5:
+                messages.append((f'... and {len(errors) - 5} more errors.', 'error'))
+
+        return messages
@@ -1,8 +1,11 @@
 import os
+import shutil
+import threading
 import uuid
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from flask import current_app
+from config import Config
 
 class FileService:
     @staticmethod
@@ -50,14 +53,37 @@ class FileService:
     def delete_file(file_path: str) -> bool:
         """Delete a file from the filesystem"""
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                return True
+            os.remove(file_path)  # One syscall; a missing file is reported instead of checked for first
+            return True
+        except FileNotFoundError:
             return False
         except Exception as e:
             print(f"Error deleting file {file_path}: {e}")
             return False
     
+    @staticmethod
+    def delete_files(file_paths) -> int:
+        """Delete several files, returning how many were removed"""
+        return sum(FileService.delete_file(file_path) for file_path in file_paths)
+    
+    @staticmethod
+    def retire_directory(path: str):
+        """
+        Move a directory out of the way with a single rename so it can be removed later
+        Returns the new path, or None if the directory doesn't exist
+        """
+        retired_path = f"{path}.deleted.{uuid.uuid4().hex}"
+        try:
+            os.rename(path, retired_path)
+        except FileNotFoundError:
+            return None
+        return retired_path
+    
+    @staticmethod
+    def remove_directory_in_background(path: str) -> None:
+        """Delete a directory tree on a daemon thread instead of the request thread"""
+        threading.Thread(target=shutil.rmtree, args=(path,), kwargs={'ignore_errors': True}, daemon=True).start()
+    
     @staticmethod
     def get_file_url(file_path: str) -> str:
         """Generate URL for accessing uploaded file"""
@@ -79,7 +105,7 @@ class FileService:
         if file.filename == '':
             return False, "No file selected"
         
-        if not current_app.config.get('allowed_file', lambda x: True)(file.filename):
+        if not Config.allowed_file(file.filename):
             return False, "Only PDF files are allowed"
         
         # Check file size (Flask's MAX_CONTENT_LENGTH handles this, but good to double-check)
@@ -1,12 +1,20 @@
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from decimal import Decimal, InvalidOperation
 import random
+import time
 from models import AppSettings
 import logging
 
 class WiseAPIService:
+    MAX_PARALLEL_REQUESTS = 4  # Concurrent balance statement fetches
+    RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})  # Rate limits and transient gateway errors
+    MAX_ATTEMPTS = 4  # First try plus three retries
+    RETRY_BASE_DELAY = 1  # Seconds; doubled on every retry
+    MAX_RETRY_DELAY = 30  # Upper bound for any single wait, including Retry-After
+    
     def __init__(self, api_url: str = None, api_token: str = None, profile_id: str = None):
         # Use provided values or get from app settings
         if api_url and api_token:
@@ -45,15 +53,18 @@ class WiseAPIService:
                 self.logger.warning("No balances found for profile")
                 return []
             
-            # Step 2: Get transactions for each balance
+            # Step 2: Get transactions for each balance. Statements are independent
+            # requests, so fetch them in parallel and wait for the slowest one only
             all_transactions = []
-            for balance in balances:
-                balance_id = balance['id']
-                currency = balance.get('currency', 'USD')
-                
-                # Get transactions for this balance
-                balance_transactions = self._get_balance_transactions(balance_id, currency, days_back)
-                all_transactions.extend(balance_transactions)
+            with ThreadPoolExecutor(max_workers=min(len(balances), self.MAX_PARALLEL_REQUESTS)) as executor:
+                statements = executor.map(
+                    lambda balance: self._get_balance_transactions(
+                        balance['id'], balance.get('currency', 'USD'), days_back
+                    ),
+                    balances
+                )
+                for balance_transactions in statements:
+                    all_transactions.extend(balance_transactions)
             
             # Sort by date (newest first)
             all_transactions.sort(key=lambda x: x.get('date', ''), reverse=True)
@@ -307,22 +318,14 @@ class WiseAPIService:
         self.logger.debug(f"Making API call to: {url}")
         self.logger.debug(f"With params: {params}")
         
-        try:
-            response = requests.get(
-                url,
-                headers=headers,
-                params=params,
-                timeout=30  # 30 second timeout
-            )
-        except requests.exceptions.Timeout:
-            self.logger.error("Wise API request timed out")
-            raise Exception("API request timed out. Please check your connection")
-        except requests.exceptions.ConnectionError:
-            self.logger.error("Failed to connect to Wise API")
-            raise Exception("Failed to connect to Wise API. Please check your internet connection")
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Wise API request failed: {e}")
-            raise Exception(f"API request failed: {str(e)}")
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            response = self._send_request(url, headers, params)
+            if response.status_code not in self.RETRY_STATUS_CODES or attempt == self.MAX_ATTEMPTS:
+                break
+            
+            delay = self._retry_delay(attempt, response.headers.get('Retry-After'))
+            self.logger.warning(f"Wise API returned {response.status_code}, retrying in {delay:.1f}s (attempt {attempt})")
+            time.sleep(delay)
         
         # Log response status
         self.logger.debug(f"Response status: {response.status_code}")
@@ -355,6 +358,32 @@ class WiseAPIService:
             self.logger.error(f"Invalid JSON response from Wise API: {e}")
             raise Exception("Invalid response format from Wise API")
     
+    def _send_request(self, url: str, headers: Dict, params: Dict = None):
+        """Send one GET request, turning transport failures into readable errors"""
+        try:
+            return requests.get(
+                url,
+                headers=headers,
+                params=params,
+                timeout=30  # 30 second timeout
+            )
+        except requests.exceptions.Timeout:
+            self.logger.error("Wise API request timed out")
+            raise Exception("API request timed out. Please check your connection")
+        except requests.exceptions.ConnectionError:
+            self.logger.error("Failed to connect to Wise API")
+            raise Exception("Failed to connect to Wise API. Please check your internet connection")
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Wise API request failed: {e}")
+            raise Exception(f"API request failed: {str(e)}")
+    
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Seconds to wait before the next attempt: the server's Retry-After if given, else jittered exponential backoff"""
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.MAX_RETRY_DELAY)
+        delay = self.RETRY_BASE_DELAY * 2 ** (attempt - 1)
+        return min(delay + random.uniform(0, delay / 2), self.MAX_RETRY_DELAY)
+    
     def test_connection(self) -> bool:
         """Test if API connection is working by fetching profile balances"""
         try:
@@ -13,6 +13,10 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Initialize tooltips if Bootstrap tooltips are used
     initializeTooltips();
+    
+    // Run bank syncs and CSV imports in the background
+    initializeBankSync();
+    initializeBackgroundUploads();
 });
 
 function initializeFileUpload() {
@@ -190,6 +194,83 @@ function initializeTooltips() {
     }
 }
 
+function initializeBankSync() {
+    const syncLinks = document.querySelectorAll('[data-bank-sync]');
+    
+    syncLinks.forEach(function(link) {
+        link.addEventListener('click', function(e) {
+            e.preventDefault();
+            if (link.classList.contains('disabled')) return;
+            
+            link.classList.add('disabled');
+            link.setAttribute('aria-disabled', 'true');
+            
+            // Start the sync, then poll until the server has flashed the result
+            fetch(link.href, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json().then(body => ({ ok: response.ok, body: body })))
+            .then(function(result) {
+                if (!result.ok) {
+                    window.location.href = link.href;  // Let the server explain (e.g. missing API token)
+                    return;
+                }
+                showAlert('Bank sync started. This page will refresh when it finishes.', 'info');
+                pollJob(result.body.status_url);
+            })
+            .catch(function() {
+                window.location.href = link.href;  // Fall back to the synchronous sync
+            });
+        });
+    });
+}
+
+function initializeBackgroundUploads() {
+    const uploadForms = document.querySelectorAll('form[data-background-upload]');
+    
+    uploadForms.forEach(function(form) {
+        // Registered after initializeFormValidation, so its checks have already run
+        form.addEventListener('submit', function(e) {
+            if (e.defaultPrevented) return;
+            e.preventDefault();
+            
+            // Upload, then poll until the server has flashed the import result
+            fetch(form.action, {
+                method: 'POST',
+                body: new FormData(form),
+                headers: { 'Accept': 'application/json' }
+            })
+            .then(response => response.json().then(body => ({ ok: response.ok, body: body })))
+            .then(function(result) {
+                if (!result.ok) {
+                    window.location.reload();  // The server flashed the reason
+                    return;
+                }
+                showAlert('Import started. This page will refresh when it finishes.', 'info');
+                pollJob(result.body.status_url);
+            })
+            .catch(function() {
+                window.location.reload();
+            });
+        });
+    });
+}
+
+function pollJob(statusUrl) {
+    setTimeout(function() {
+        fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+        .then(response => response.json())
+        .then(function(job) {
+            if (job.status === 'running') {
+                pollJob(statusUrl);
+            } else {
+                window.location.reload();
+            }
+        })
+        .catch(function() {
+            window.location.reload();
+        });
+    }, 1000);
+}
+
 function showAlert(message, type = 'info') {
     // Create and show a dynamic alert
     const alertContainer = document.querySelector('.container');
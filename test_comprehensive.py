@@ -239,6 +239,49 @@ class TestInputValidator:
         assert result['merchant'] == 'Test Merchant'
         assert result['payment_reference'] == 'REF123'
     
+    def test_validate_registration(self):
+        """Test registration form validation."""
+        form = {
+            'email': ' New@Example.com ',
+            'first_name': 'jane',
+            'last_name': 'doe',
+            'password': 'password123',
+            'confirm_password': 'password123'
+        }
+        assert InputValidator.validate_registration(form) == {
+            'email': 'new@example.com',
+            'first_name': 'Jane',
+            'last_name': 'Doe',
+            'password': 'password123'
+        }
+        
+        with pytest.raises(ValidationError, match="All fields are required"):
+            InputValidator.validate_registration({**form, 'last_name': ' '})
+        
+        with pytest.raises(ValidationError, match="valid email address"):
+            InputValidator.validate_registration({**form, 'email': 'not-an-email'})
+        
+        with pytest.raises(ValidationError, match="at least 8 characters"):
+            InputValidator.validate_registration({**form, 'password': 'short', 'confirm_password': 'short'})
+        
+        with pytest.raises(ValidationError, match="Passwords do not match"):
+            InputValidator.validate_registration({**form, 'confirm_password': 'password124'})
+        
+        with pytest.raises(ValidationError, match="at least 2 characters"):
+            InputValidator.validate_registration({**form, 'first_name': 'J'})
+
+    def test_validate_rows(self):
+        """Test batch validation collects per-row errors."""
+        row = {'date': '2024-01-15', 'description': 'Test', 'amount': '10.00', 'currency': 'USD'}
+        valid_rows, errors = InputValidator.validate_rows([
+            (2, row),
+            (3, {**row, 'amount': ''}),
+            (4, {**row, 'date': '2024-01-16'}),
+        ])
+
+        assert [r['date'] for r in valid_rows] == [date(2024, 1, 15), date(2024, 1, 16)]
+        assert errors == ['Row 3: Amount cannot be empty']
+    
     def test_validate_file_upload(self):
         """Test file upload validation."""
         # Valid file
@@ -409,6 +452,60 @@ class TestTransactionDeduplicator:
             assert transaction.id == existing.id
             assert confidence >= 0.8
 
+    def test_is_duplicate_with_index(self, app):
+        """Test duplicate detection against a preloaded index."""
+        with app.app_context():
+            user = User(email='index@example.com', first_name='Index', last_name='User')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+
+            existing = Transaction(
+                user_id=user.id,
+                date=date(2024, 1, 15),
+                amount=Decimal('100.50'),
+                currency='USD',
+                description='Test payment',
+                payment_reference='REF123'
+            )
+            db.session.add(existing)
+            db.session.commit()
+
+            index = TransactionDeduplicator.build_index(user.id, [date(2024, 1, 15), date(2024, 1, 16)])
+
+            is_dup, transaction, confidence = TransactionDeduplicator.is_duplicate(
+                date=date(2024, 1, 15),
+                amount=Decimal('100.50'),
+                description='Test payment',
+                payment_reference='REF123',
+                user_id=user.id,
+                index=index
+            )
+            assert is_dup is True
+            assert transaction.id == existing.id
+            assert index.contains_exact(date(2024, 1, 15), '100.50', '  TEST payment ')
+            assert not index.contains_exact(date(2024, 1, 15), '100.51', 'Test payment')
+
+            # Rows queued in the same batch are candidates too
+            queued = Transaction(
+                user_id=user.id,
+                date=date(2024, 1, 16),
+                amount=Decimal('42.00'),
+                currency='USD',
+                description='Queued row'
+            )
+            index.add(queued)
+            is_dup, transaction, confidence = TransactionDeduplicator.is_duplicate(
+                date=date(2024, 1, 16),
+                amount=Decimal('42.00'),
+                description='Queued row',
+                confidence_threshold=0.75,
+                user_id=user.id,
+                index=index
+            )
+            assert is_dup is True
+            assert transaction is queued
+
 
 class TestUserModel:
     """Test User model class."""
@@ -443,6 +540,18 @@ class TestUserModel:
             assert user.check_password('mypassword') is True
             assert user.check_password('wrongpassword') is False
     
+    def test_legacy_password_rehash(self, app):
+        """Test legacy hashes are upgraded on successful password check."""
+        user = User(email='test@example.com', first_name='Test', last_name='User')
+        user.password_hash = generate_password_hash('mypassword', method='pbkdf2:sha256')
+        
+        assert user.check_password('wrongpassword') is False
+        assert user.password_hash.startswith('pbkdf2:')
+        
+        assert user.check_password('mypassword') is True
+        assert not user.password_needs_rehash()
+        assert user.check_password('mypassword') is True
+    
     def test_upload_path(self, app):
         """Test user upload path generation."""
         with app.app_context():
@@ -492,6 +601,70 @@ class TestTransactionModel:
             assert sample_transaction.is_coded is True
             assert sample_transaction.status_display == 'Reconciled'
             assert sample_transaction.transaction_code.category_name == 'Revenue'
+    
+    def test_bulk_fill_missing(self, app):
+        """Test bulk fill-in only sets blank columns."""
+        with app.app_context():
+            user = User(email='fill@example.com', first_name='Fill', last_name='User')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+            
+            transaction = Transaction(
+                user_id=user.id,
+                date=date(2024, 1, 15),
+                amount=Decimal('100.50'),
+                currency='USD',
+                description='Test transaction',
+                payee_name='Original payee',
+                merchant=''
+            )
+            db.session.add(transaction)
+            db.session.commit()
+            
+            Transaction.bulk_fill_missing([{
+                'id': transaction.id,
+                'payment_reference': 'REF123',
+                'payee_name': 'New payee',
+                'merchant': 'New merchant'
+            }])
+            db.session.commit()
+            
+            assert transaction.payment_reference == 'REF123'
+            assert transaction.payee_name == 'Original payee'
+            assert transaction.merchant == 'New merchant'
+    
+    def test_bulk_delete(self, app):
+        """Test bulk delete removes codes and documents and only touches the user's rows."""
+        with app.app_context():
+            owner = User(email='owner@example.com', first_name='Owner', last_name='User')
+            other = User(email='other@example.com', first_name='Other', last_name='User')
+            owner.set_password('testpassword123')
+            other.set_password('testpassword123')
+            db.session.add_all([owner, other])
+            db.session.commit()
+            
+            owned = Transaction(user_id=owner.id, date=date(2024, 1, 15), amount=Decimal('10.00'),
+                                currency='USD', description='Owned')
+            foreign = Transaction(user_id=other.id, date=date(2024, 1, 15), amount=Decimal('20.00'),
+                                  currency='USD', description='Foreign')
+            db.session.add_all([owned, foreign])
+            db.session.flush()
+            document = Document(user_id=owner.id, filename='receipt.pdf', file_path='/tmp/receipt-bulk-delete.pdf')
+            owned.documents.append(document)
+            db.session.add(TransactionCode(user_id=owner.id, transaction_id=owned.id, category_name='Expense'))
+            db.session.commit()
+            owned_id, foreign_id = owned.id, foreign.id
+            
+            deleted_count, file_paths = Transaction.bulk_delete(owner.id, [owned_id, foreign_id])
+            db.session.commit()
+            
+            assert deleted_count == 1
+            assert file_paths == ['/tmp/receipt-bulk-delete.pdf']
+            assert db.session.get(Transaction, owned_id) is None
+            assert db.session.get(Transaction, foreign_id) is not None
+            assert TransactionCode.query.count() == 0
+            assert Document.query.count() == 0
 
 
 class TestWiseAPIService:
@@ -538,6 +711,23 @@ class TestWiseAPIService:
         with pytest.raises(Exception, match='API Error'):
             service._make_api_call('/test')
     
+    @patch('services.wise_api.time.sleep')
+    @patch('requests.get')
+    def test_api_call_retries_transient_errors(self, mock_get, mock_sleep):
+        """Test rate limited and unavailable responses are retried with backoff."""
+        throttled = Mock(status_code=503, headers={'Retry-After': '2'})
+        success = Mock(status_code=200, headers={})
+        success.json.return_value = {'test': 'data'}
+        success.raise_for_status.return_value = None
+        mock_get.side_effect = [throttled, success]
+        
+        service = WiseAPIService('https://api.test.com', 'token', '123')
+        result = service._make_api_call('/test')
+        
+        assert result == {'test': 'data'}
+        assert mock_get.call_count == 2
+        mock_sleep.assert_called_once_with(2.0)
+    
     def test_dummy_transactions_generation(self):
         """Test dummy transaction generation."""
         service = WiseAPIService('https://api.test.com', 'token', '123')
@@ -651,6 +841,43 @@ class TestAppSettings:
             # Get with default
             default_value = AppSettings.get_user_setting(test_user.id, 'NON_EXISTENT', 'default')
             assert default_value == 'default'
+    
+    def test_user_wise_config(self, app):
+        """Test Wise config lookup is scoped to the user and filled with defaults."""
+        AppSettings.set_user_setting(1, 'WISE_API_TOKEN', 'token-1234567')
+        AppSettings.set_user_setting(1, 'WISE_SANDBOX_MODE', True)
+        AppSettings.set_user_setting(2, 'WISE_API_TOKEN', 'other-token')
+        
+        config = AppSettings.get_user_wise_config(1)
+        assert config == {
+            'api_url': 'https://api.wise.com',
+            'api_token': 'token-1234567',
+            'entity_number': '',
+            'is_sandbox': True
+        }
+
+    def test_user_setting_request_cache(self, app):
+        """Test cached lookups (including misses) are dropped when the setting is written."""
+        assert AppSettings.get_user_setting(1, 'CACHED_KEY', 'default') == 'default'
+        
+        AppSettings.set_user_setting(1, 'cached_key', 'first')
+        assert AppSettings.get_user_setting(1, 'CACHED_KEY') == 'first'
+        
+        AppSettings.set_user_setting(1, 'CACHED_KEY', 'second')
+        assert AppSettings.get_user_setting(1, 'cached_key') == 'second'
+    
+    def test_set_user_wise_config(self, app):
+        """Test saving Wise config twice updates the user's rows in place."""
+        AppSettings.set_user_wise_config(1, 'https://api.wise.com', 'token-1234567', '12345', True)
+        AppSettings.set_user_wise_config(1, 'https://api.wise.com', '', '', False)
+
+        assert AppSettings.query.filter_by(user_id=1).count() == 4
+        assert AppSettings.get_user_wise_config(1) == {
+            'api_url': 'https://api.wise.com',
+            'api_token': '',
+            'entity_number': '',
+            'is_sandbox': False
+        }
 
 
 class TestRoutes:
@@ -709,7 +936,226 @@ class TestRoutes:
         """Test dashboard with authenticated user."""
         response = authenticated_client.get('/')
         assert response.status_code == 200
-    
+
+    def test_dashboard_cache_invalidated_on_commit(self, app):
+        """Test cached dashboard stats are dropped when the user's data changes."""
+        from utils.dashboard_cache import get_cache
+        with app.app_context():
+            user = User(email='cache@example.com', first_name='Cache', last_name='User')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+
+            cache = get_cache()
+            cache.set(user.id, {'total_transactions': 0})
+            cache.set(user.id + 1, {'total_transactions': 0})
+
+            db.session.add(Transaction(
+                user_id=user.id, date=date(2024, 1, 15), amount=Decimal('10.00'),
+                currency='USD', description='Cached'
+            ))
+            db.session.commit()
+
+            assert cache.get(user.id) is None
+            assert cache.get(user.id + 1) is not None
+
+    def test_background_job_state_is_stored(self, app):
+        """Test background jobs are read from the database once and expired ones purged."""
+        from models import BackgroundJob
+        from services import background_jobs
+
+        with app.app_context():
+            user = User(email='jobs@example.com', first_name='Jobs', last_name='User')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+
+            expired = datetime.utcnow() - background_jobs.FINISHED_JOB_TTL - timedelta(minutes=1)
+            db.session.add(BackgroundJob(
+                id='expired', user_id=user.id, status='finished', messages=[], finished_at=expired
+            ))
+            db.session.add(BackgroundJob(
+                id='done', user_id=user.id, status='finished', messages=[['Imported', 'success']],
+                finished_at=datetime.utcnow()
+            ))
+            db.session.commit()
+
+            with app.test_request_context():
+                job_id = background_jobs.start(user.id, 'Error', lambda: [])
+            assert db.session.get(BackgroundJob, 'expired') is None
+            assert db.session.get(BackgroundJob, job_id) is not None
+
+            assert background_jobs.get_job('done', user.id + 1) is None
+            assert background_jobs.get_job('done', user.id) == {
+                'status': 'finished', 'messages': [['Imported', 'success']]
+            }
+            assert background_jobs.get_job('done', user.id) is None
+
+    def test_csv_upload_job_is_polled(self, app, client):
+        """Test a background CSV upload reports its result through the job status URL."""
+        import time
+
+        with app.app_context():
+            user = User(email='csvjob@example.com', first_name='Csv', last_name='Job')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user.id)
+                sess['_fresh'] = True
+
+            csv_data = b'date,description,amount\n2024-01-15,Coffee,4.50\nbad,Row,1\n'
+            response = client.post('/upload-transactions', data={
+                'upload_type': 'csv',
+                'csv_file': (BytesIO(csv_data), 'upload.csv')
+            }, headers={'Accept': 'application/json'})
+            assert response.status_code == 202
+
+            for _ in range(50):
+                job = client.get(response.json['status_url'])
+                if job.json['status'] != 'running':
+                    break
+                time.sleep(0.1)
+            assert job.status_code == 200
+            assert job.json['status'] == 'finished'
+
+            with client.session_transaction() as sess:
+                flashed = [message for category, message in sess['_flashes']]
+            assert 'Successfully uploaded 1 new transactions!' in flashed
+            assert any(message.startswith('Row 3:') for message in flashed)
+            assert client.get(response.json['status_url']).status_code == 404
+
+    def test_csv_import_service(self, app):
+        """Test CSV rows are imported with duplicates skipped and errors reported."""
+        from services.csv_import import CsvImportService
+        with app.app_context():
+            user = User(email='csvimport@example.com', first_name='Csv', last_name='User')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+
+            row = {'date': '2024-01-15', 'description': 'Coffee', 'amount': '4.50', 'currency': 'USD',
+                   'payee_name': '', 'merchant': '', 'payment_reference': ''}
+            messages = CsvImportService.import_rows(user.id, [
+                (2, row), (3, dict(row)), (4, dict(row, date='not-a-date'))
+            ])
+
+            assert ('Successfully uploaded 1 new transactions!', 'success') in messages
+            assert ('Skipped 1 duplicate transactions.', 'warning') in messages
+            assert any(message.startswith('Row 4:') for message, _ in messages)
+            assert Transaction.query.filter_by(user_id=user.id).count() == 1
+
+    def test_export_csv_streams_rows(self, app, client):
+        """Test the CSV export is streamed with every coded transaction."""
+        with app.app_context():
+            user = User(email='export@example.com', first_name='Export', last_name='User')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+
+            transaction = Transaction(
+                user_id=user.id, date=date(2024, 1, 15), amount=Decimal('10.00'),
+                currency='USD', description='Exported'
+            )
+            db.session.add(transaction)
+            db.session.flush()
+            db.session.add(TransactionCode(user_id=user.id, transaction_id=transaction.id, category_name='Revenue'))
+            db.session.commit()
+
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user.id)
+                sess['_fresh'] = True
+
+            response = client.get('/export/csv?start_date=2024-01-01&end_date=2024-12-31')
+            assert response.status_code == 200
+            assert response.is_streamed
+            lines = response.get_data(as_text=True).splitlines()
+            assert lines[0].startswith('Date,Description,Amount')
+            assert lines[1] == '2024-01-15,Exported,10.00,USD,Revenue,,,,,No documents'
+
+    def test_export_complete_streams_zip(self, app, client, tmp_path):
+        """Test the complete export streams a ZIP with the CSV, summary and documents."""
+        import zipfile
+
+        pdf_path = tmp_path / 'receipt.pdf'
+        pdf_path.write_bytes(b'%PDF-1.4 receipt')
+        unreadable_path = tmp_path / 'unreadable.pdf'
+        unreadable_path.mkdir()  # Exists but cannot be opened as a file
+
+        with app.app_context():
+            user = User(email='zipexport@example.com', first_name='Zip', last_name='User')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+
+            transaction = Transaction(
+                user_id=user.id, date=date(2024, 1, 15), amount=Decimal('10.00'),
+                currency='USD', description='Exported'
+            )
+            document = Document(user_id=user.id, filename='receipt.pdf', file_path=str(pdf_path))
+            transaction.documents.append(document)
+            transaction.documents.append(
+                Document(user_id=user.id, filename='unreadable.pdf', file_path=str(unreadable_path))
+            )
+            db.session.add(transaction)
+            db.session.flush()
+            db.session.add(TransactionCode(user_id=user.id, transaction_id=transaction.id, category_name='Revenue'))
+            db.session.commit()
+            document_name = f'documents/T{transaction.id}_{document.id}_receipt.pdf'
+
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user.id)
+                sess['_fresh'] = True
+
+            response = client.get('/export/complete?start_date=2024-01-01&end_date=2024-12-31')
+            assert response.status_code == 200
+            assert response.is_streamed
+            archive = zipfile.ZipFile(BytesIO(response.data))
+            assert archive.testzip() is None
+            assert archive.namelist() == [
+                'transactions_2024-01-01_to_2024-12-31.csv',
+                document_name,
+                'summary_2024-01-01_to_2024-12-31.txt',
+            ]
+            csv_lines = archive.read('transactions_2024-01-01_to_2024-12-31.csv').decode().splitlines()
+            assert csv_lines[1].endswith(f'{document_name[len("documents/"):]}; ERROR: unreadable.pdf,1')
+            assert archive.read(document_name) == b'%PDF-1.4 receipt'
+            assert archive.getinfo(document_name).compress_type == zipfile.ZIP_STORED
+            assert '- Total Revenue: USD 10.00' in archive.read('summary_2024-01-01_to_2024-12-31.txt').decode()
+
+    def test_report_currency_totals(self, app):
+        """Test report totals are summed per currency in the database."""
+        from routes.reports import _currency_totals
+
+        with app.app_context():
+            user = User(email='totals@example.com', first_name='Totals', last_name='User')
+            user.set_password('testpassword123')
+            db.session.add(user)
+            db.session.commit()
+
+            for day, amount, currency, category in [
+                (10, '100.00', 'EUR', 'Revenue'),
+                (11, '-40.00', 'EUR', 'Expense'),
+                (12, '25.00', 'USD', 'Revenue'),
+                (13, '-5.00', 'USD', 'Expense'),
+            ]:
+                transaction = Transaction(
+                    user_id=user.id, date=date(2024, 1, day), amount=Decimal(amount),
+                    currency=currency, description=f'Total {day}'
+                )
+                db.session.add(transaction)
+                db.session.flush()
+                db.session.add(TransactionCode(user_id=user.id, transaction_id=transaction.id, category_name=category))
+            db.session.commit()
+
+            totals = _currency_totals(
+                user.id, date(2024, 1, 1), date(2024, 1, 31), db.func.max(Transaction.date).desc()
+            )
+            assert list(totals) == ['USD', 'EUR']
+            assert totals['EUR'] == {'revenue': Decimal('100.00'), 'expense': Decimal('40.00')}
+            assert totals['USD'] == {'revenue': Decimal('25.00'), 'expense': Decimal('5.00')}
+
     def test_transactions_list(self, authenticated_client):
         """Test transactions listing."""
         response = authenticated_client.get('/transactions')
@@ -741,6 +1187,13 @@ class TestSecurity:
         # Should work because CSRF is disabled in test config
         assert response.status_code in [200, 302]
     
+    def test_security_headers(self, client):
+        """Test security headers are set on every response."""
+        response = client.get('/login')
+        assert response.headers['X-Frame-Options'] == 'DENY'
+        assert response.headers['X-Content-Type-Options'] == 'nosniff'
+        assert "frame-ancestors 'none'" in response.headers['Content-Security-Policy']
+    
     def test_sql_injection_protection(self, authenticated_client):
         """Test SQL injection protection in search."""
         # Try SQL injection in search
@@ -487,6 +487,14 @@ class TestSecurityEdgeCases:
                 # More sophisticated encoding would need better protection
                 pass
 
+    def test_tampered_session_user_id(self, app):
+        """Test user loader with non-numeric session user ids."""
+        load_user = app.login_manager._user_callback
+
+        with app.test_request_context():
+            for user_id in ['abc', '', None, '1; DROP TABLE users']:
+                assert load_user(user_id) is None
+
 
 class TestPerformanceEdgeCases:
     """Test performance under edge conditions."""
@@ -0,0 +1,118 @@
+"""
+Per-user cache for dashboard statistics.
+Entries expire after DASHBOARD_CACHE_TIMEOUT seconds and are dropped as soon as a
+commit touches the user's transactions, codes or documents.
+"""
+
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import Transaction, TransactionCode, Document
+
+# Models whose rows feed the dashboard numbers
+DASHBOARD_MODELS = (Transaction, TransactionCode, Document)
+DASHBOARD_TABLES = frozenset(model.__table__ for model in DASHBOARD_MODELS)
+
+
+class DashboardCache:
+    """Thread-safe in-process store of dashboard stats keyed by user ID"""
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return the cached stats for a user, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, stats = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            return stats
+
+    def set(self, user_id, stats):
+        """Store stats for a user"""
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.timeout, stats)
+
+    def invalidate(self, user_ids):
+        """Drop the cached stats for the given users, or for everyone if user_ids is None"""
+        with self._lock:
+            if user_ids is None:
+                self._entries.clear()
+                return
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+
+def init_app(app):
+    """Attach a dashboard cache to the app"""
+    app.extensions['dashboard_cache'] = DashboardCache(app.config.get('DASHBOARD_CACHE_TIMEOUT', 60))
+
+
+def get_cache():
+    """Return the current app's dashboard cache"""
+    return current_app.extensions['dashboard_cache']
+
+
+def invalidate_users(session, user_ids):
+    """Mark users whose dashboard must be recomputed once the session commits (None for everyone)"""
+    if user_ids is None:
+        session.info['dashboard_dirty_users'] = None
+    elif session.info.get('dashboard_dirty_users', ()) is not None:
+        session.info.setdefault('dashboard_dirty_users', set()).update(user_ids)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_writes(orm_execute_state):
+    """Catch INSERT/UPDATE/DELETE statements that bypass the unit of work, such as Transaction.bulk_insert"""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if getattr(orm_execute_state.statement, 'table', None) not in DASHBOARD_TABLES:
+        return
+    
+    params = orm_execute_state.parameters
+    if orm_execute_state.is_insert and params:
+        rows = params if isinstance(params, list) else [params]
+        invalidate_users(orm_execute_state.session, {row.get('user_id') for row in rows})
+    else:
+        # Criteria-based writes don't say whose rows they touch
+        invalidate_users(orm_execute_state.session, None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_dirty_users(session, flush_context):
+    """Remember which users had dashboard rows written in this flush"""
+    user_ids = set()
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, DASHBOARD_MODELS):
+            # Read the loaded value directly; an expired attribute would need a query mid-flush
+            user_id = inspect(instance).dict.get('user_id')
+            if user_id is None:
+                invalidate_users(session, None)
+                return
+            user_ids.add(user_id)
+    if user_ids:
+        invalidate_users(session, user_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_dirty_users(session):
+    """Drop cached stats only after the writes are visible to other requests"""
+    if 'dashboard_dirty_users' not in session.info:
+        return
+    user_ids = session.info.pop('dashboard_dirty_users')
+    if has_app_context() and 'dashboard_cache' in current_app.extensions:
+        get_cache().invalidate(user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_dirty_users(session):
+    """Nothing was written, so nothing needs invalidating"""
+    session.info.pop('dashboard_dirty_users', None)
@@ -1,12 +1,92 @@
 """
 Transaction deduplication utilities for robust duplicate detection across import methods.
 """
+from datetime import timedelta
 from decimal import Decimal, ROUND_HALF_UP
 from difflib import SequenceMatcher
+from functools import lru_cache
 from models import Transaction, db
+from collections import defaultdict
 import re
 
 
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Common banking suffixes/prefixes that might vary, applied in order
+DESCRIPTION_NOISE_PATTERNS = [
+    re.compile(r'\b(payment|transfer|debit|credit)\b', re.IGNORECASE),
+    re.compile(r'\b(ref\s*:?\s*\w+)\b', re.IGNORECASE),
+    re.compile(r'\b(transaction\s*id\s*:?\s*\w+)\b', re.IGNORECASE)
+]
+
+
+@lru_cache(maxsize=4096)
+def _normalize_description(description):
+    """Normalize a non-empty description; cached because each candidate is compared many times per import"""
+    # Convert to lowercase and remove extra whitespace
+    normalized = ' '.join(description.lower().strip().split())
+    
+    for pattern in DESCRIPTION_NOISE_PATTERNS:
+        normalized = pattern.sub('', normalized)
+    
+    return ' '.join(normalized.split())  # Remove extra spaces after removal
+
+
+def _similarity(text1, text2):
+    """SequenceMatcher ratio with a shortcut for identical strings, the usual case for real duplicates"""
+    if text1 == text2:
+        return 1.0
+    return SequenceMatcher(None, text1, text2).ratio()
+
+
+class DuplicateIndex:
+    """
+    In-memory duplicate candidates for a batch import, bucketed by date.
+    Rows queued for insertion are added so later rows in the batch are checked against them.
+    """
+    
+    def __init__(self, transactions):
+        # Each bucket is kept newest first, like the created_at ordering of the database query
+        self._by_date = defaultdict(list)
+        # (date, amount, normalized description) of every row, for exact re-import matches
+        self._exact_keys = set()
+        for transaction in transactions:
+            amount = TransactionDeduplicator.normalize_amount(transaction.amount)
+            self._by_date[transaction.date].append((amount, transaction))
+            self._add_exact_key(transaction.date, amount, transaction.description)
+    
+    def _add_exact_key(self, date, amount, description):
+        if description:
+            self._exact_keys.add((date, amount, TransactionDeduplicator.normalize_description(description)))
+    
+    def add(self, row):
+        """Register a row queued for insertion as the newest candidate for its date"""
+        amount = TransactionDeduplicator.normalize_amount(row.amount)
+        self._by_date[row.date].insert(0, (amount, row))
+        self._add_exact_key(row.date, amount, row.description)
+    
+    def contains_exact(self, date, amount, description):
+        """
+        True if a row with the same date, amount and normalized description exists.
+        Such a row scores at least 0.75 in is_duplicate (amount 0.4 + description 0.35).
+        """
+        if not description:
+            return False
+        return (
+            date,
+            TransactionDeduplicator.normalize_amount(amount),
+            TransactionDeduplicator.normalize_description(description)
+        ) in self._exact_keys
+    
+    def candidates(self, date, min_amount, max_amount, exclude_id=None):
+        """Return the rows on date whose amount lies within [min_amount, max_amount]"""
+        return [
+            row for amount, row in self._by_date.get(date, ())
+            if min_amount <= amount <= max_amount
+            and not (exclude_id and getattr(row, 'id', None) == exclude_id)
+        ]
+
+
 class TransactionDeduplicator:
     """
     Handles robust duplicate detection for transactions across all import methods.
@@ -48,20 +128,7 @@ class TransactionDeduplicator:
         if not description:
             return ""
         
-        # Convert to lowercase and remove extra whitespace
-        normalized = ' '.join(description.lower().strip().split())
-        
-        # Remove common banking suffixes/prefixes that might vary
-        patterns_to_remove = [
-            r'\b(payment|transfer|debit|credit)\b',
-            r'\b(ref\s*:?\s*\w+)\b',
-            r'\b(transaction\s*id\s*:?\s*\w+)\b'
-        ]
-        
-        for pattern in patterns_to_remove:
-            normalized = re.sub(pattern, '', normalized, flags=re.IGNORECASE)
-        
-        return ' '.join(normalized.split())  # Remove extra spaces after removal
+        return _normalize_description(description)
     
     @staticmethod
     def normalize_reference(reference):
@@ -76,7 +143,7 @@ class TransactionDeduplicator:
         """
         if not reference:
             return ""
-        return re.sub(r'\s+', '', reference.upper())
+        return WHITESPACE_PATTERN.sub('', reference.upper())
     
     @staticmethod
     def calculate_description_similarity(desc1, desc2):
@@ -96,11 +163,36 @@ class TransactionDeduplicator:
         norm1 = TransactionDeduplicator.normalize_description(desc1)
         norm2 = TransactionDeduplicator.normalize_description(desc2)
         
-        return SequenceMatcher(None, norm1, norm2).ratio()
+        return _similarity(norm1, norm2)
+    
+    @classmethod
+    def build_index(cls, user_id, dates):
+        """
+        Preload the candidate transactions for a batch of imports in one query.
+        
+        Args:
+            user_id: User whose transactions are searched
+            dates: Dates of the incoming transactions
+            
+        Returns:
+            DuplicateIndex: Index to pass to is_duplicate for every row of the batch
+        """
+        dates = set(dates)
+        if not dates:
+            return DuplicateIndex([])
+        
+        # Candidates only ever match on the exact date, so the window needs no padding
+        transactions = Transaction.query.filter(
+            Transaction.user_id == user_id,
+            Transaction.date >= min(dates),
+            Transaction.date < max(dates) + timedelta(days=1)
+        ).order_by(Transaction.created_at.desc()).all()
+        
+        return DuplicateIndex(transactions)
     
     @classmethod
     def find_potential_duplicates(cls, date, amount, description, payment_reference=None, 
-                                 payee_name=None, exclude_id=None, user_id=None):
+                                 payee_name=None, exclude_id=None, user_id=None, index=None):
         """
         Find potential duplicate transactions using multiple criteria.
         
@@ -112,6 +204,7 @@ class TransactionDeduplicator:
             payee_name: Optional payee name
             exclude_id: Optional transaction ID to exclude from results
             user_id: Optional user ID to filter by (for multi-user support)
+            index: Optional DuplicateIndex from build_index, used instead of querying the database
             
         Returns:
             list: List of (transaction, confidence_score) tuples, ordered by confidence
@@ -126,20 +219,24 @@ class TransactionDeduplicator:
         min_amount = normalized_amount - amount_tolerance
         max_amount = normalized_amount + amount_tolerance
         
-        query = Transaction.query.filter(
-            Transaction.date == date,
-            Transaction.amount.between(min_amount, max_amount)
-        )
-        
-        # Filter by user if provided (multi-user support)
-        if user_id is not None:
-            query = query.filter(Transaction.user_id == user_id)
-        
-        if exclude_id:
-            query = query.filter(Transaction.id != exclude_id)
+        if index is not None:
+            candidates = index.candidates(date, min_amount, max_amount, exclude_id)[:20]
+        else:
+            query = Transaction.query.filter(
+                Transaction.date == date,
+                Transaction.amount.between(min_amount, max_amount)
+            )
+            
+            # Filter by user if provided (multi-user support)
+            if user_id is not None:
+                query = query.filter(Transaction.user_id == user_id)
+            
+            if exclude_id:
+                query = query.filter(Transaction.id != exclude_id)
+            
+            # Limit to recent transactions to avoid scanning entire history
+            candidates = query.order_by(Transaction.created_at.desc()).limit(20).all()
         
-        # Limit to recent transactions to avoid scanning entire history
-        candidates = query.order_by(Transaction.created_at.desc()).limit(20).all()
         potential_duplicates = []
         
         for candidate in candidates:
@@ -197,18 +294,18 @@ class TransactionDeduplicator:
         
         # Payee name matching (10% weight)  
         if payee_name and candidate.payee_name:
-            payee_similarity = SequenceMatcher(
-                None, 
+            payee_similarity = _similarity(
                 payee_name.lower().strip(), 
                 candidate.payee_name.lower().strip()
-            ).ratio()
+            )
             confidence += payee_similarity * 0.1
         
         return min(confidence, 1.0)  # Cap at 1.0
     
     @classmethod
     def is_duplicate(cls, date, amount, description, payment_reference=None, 
-                    payee_name=None, exclude_id=None, confidence_threshold=0.8, user_id=None):
+                    payee_name=None, exclude_id=None, confidence_threshold=0.8, user_id=None,
+                    index=None):
         """
         Check if a transaction is likely a duplicate.
         
@@ -221,12 +318,13 @@ class TransactionDeduplicator:
             exclude_id: Optional transaction ID to exclude
             confidence_threshold: Minimum confidence to consider duplicate (default 0.8)
             user_id: Optional user ID to filter by (for multi-user support)
+            index: Optional DuplicateIndex from build_index, used instead of querying the database
             
         Returns:
             tuple: (is_duplicate: bool, existing_transaction: Transaction or None, confidence: float)
         """
         potential_duplicates = cls.find_potential_duplicates(
-            date, amount, description, payment_reference, payee_name, exclude_id, user_id
+            date, amount, description, payment_reference, payee_name, exclude_id, user_id, index
         )
         
         if potential_duplicates and potential_duplicates[0][1] >= confidence_threshold:
@@ -64,11 +64,16 @@ class UserDataManager:
     def get_user_statistics():
         """Get dashboard statistics for current user"""
         # Total transactions
-        total_transactions = Transaction.query.filter_by(user_id=current_user.id).count()
+        total_transactions = db.session.scalar(
+            db.select(db.func.count(Transaction.id)).where(Transaction.user_id == current_user.id)
+        )
         
         # Reconciled (have transaction codes)
-        reconciled = db.session.query(Transaction).filter_by(user_id=current_user.id)\
-            .join(TransactionCode).count()
+        reconciled = db.session.scalar(
+            db.select(db.func.count(Transaction.id))
+            .join(TransactionCode)
+            .where(Transaction.user_id == current_user.id)
+        )
         
         # Unreconciled
         unreconciled = total_transactions - reconciled
@@ -36,6 +36,22 @@ class InputValidator:
     MIN_AMOUNT = Decimal('0.01')
     MAX_AMOUNT = Decimal('999999999.99')
     
+    # Account fields
+    EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+    MIN_PASSWORD_LENGTH = 8
+    MIN_NAME_LENGTH = 2
+    
+    # Text content checks, compiled once into a single scan per field
+    DANGEROUS_CONTENT_PATTERN = re.compile(
+        r'<script[^>]*>.*?</script>|javascript:|on\w+\s*=|<iframe[^>]*>.*?</iframe>',
+        re.IGNORECASE | re.DOTALL
+    )
+    
+    # Date bounds and accepted string formats
+    MIN_DATE = date(1900, 1, 1)
+    MAX_DATE = date(2100, 12, 31)
+    DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d')
+    
     @staticmethod
     def validate_amount(amount: Union[str, int, float, Decimal]) -> Decimal:
         """
@@ -56,13 +72,15 @@ class InputValidator:
                 if not amount:
                     raise ValidationError("Amount cannot be empty")
             
-            decimal_amount = Decimal(str(amount))
+            # Strings (every CSV and form value) go straight to Decimal; floats via str to avoid binary noise
+            decimal_amount = Decimal(amount if isinstance(amount, str) else str(amount))
+            magnitude = abs(decimal_amount)
             
             # Check for reasonable bounds
-            if abs(decimal_amount) < InputValidator.MIN_AMOUNT and decimal_amount != 0:
+            if magnitude < InputValidator.MIN_AMOUNT and decimal_amount != 0:
                 raise ValidationError(f"Amount must be at least {InputValidator.MIN_AMOUNT} or zero")
             
-            if abs(decimal_amount) > InputValidator.MAX_AMOUNT:
+            if magnitude > InputValidator.MAX_AMOUNT:
                 raise ValidationError(f"Amount cannot exceed {InputValidator.MAX_AMOUNT}")
             
             # Check for too many decimal places (max 2 for currency)
@@ -129,23 +147,31 @@ class InputValidator:
             if not date_input:
                 raise ValidationError("Date is required")
             
-            # Try common date formats
-            formats = ['%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d']
-            
-            for fmt in formats:
+            # Fast path for zero-padded ISO dates, the format of bank exports and the API
+            parsed_date = None
+            if len(date_input) == 10 and date_input[4] == '-' and date_input[7] == '-':
                 try:
-                    parsed_date = datetime.strptime(date_input, fmt).date()
-                    
-                    # Check for reasonable date bounds
-                    min_date = date(1900, 1, 1)
-                    max_date = date(2100, 12, 31)
-                    
-                    if parsed_date < min_date or parsed_date > max_date:
-                        raise ValidationError(f"Date must be between {min_date} and {max_date}")
-                    
-                    return parsed_date
+                    parsed_date = date.fromisoformat(date_input)
                 except ValueError:
-                    continue
+                    pass
+            
+            # Try common date formats
+            if parsed_date is None:
+                for fmt in InputValidator.DATE_FORMATS:
+                    try:
+                        parsed_date = datetime.strptime(date_input, fmt).date()
+                        break
+                    except ValueError:
+                        continue
+            
+            if parsed_date is not None:
+                # Check for reasonable date bounds
+                if parsed_date < InputValidator.MIN_DATE or parsed_date > InputValidator.MAX_DATE:
+                    raise ValidationError(
+                        f"Date must be between {InputValidator.MIN_DATE} and {InputValidator.MAX_DATE}"
+                    )
+                
+                return parsed_date
             
             raise ValidationError(f"Invalid date format: {date_input}")
         
@@ -189,16 +215,8 @@ class InputValidator:
             raise ValidationError(f"{field_name} cannot exceed {max_length} characters")
         
         # Check for potentially dangerous content (basic XSS prevention)
-        dangerous_patterns = [
-            r'<script[^>]*>.*?</script>',
-            r'javascript:',
-            r'on\w+\s*=',
-            r'<iframe[^>]*>.*?</iframe>'
-        ]
-        
-        for pattern in dangerous_patterns:
-            if re.search(pattern, value, re.IGNORECASE | re.DOTALL):
-                raise ValidationError(f"{field_name} contains potentially dangerous content")
+        if InputValidator.DANGEROUS_CONTENT_PATTERN.search(value):
+            raise ValidationError(f"{field_name} contains potentially dangerous content")
         
         return value
     
@@ -293,6 +311,72 @@ class InputValidator:
         
         return validated_data
     
+    @staticmethod
+    def validate_rows(rows) -> Tuple[list, list]:
+        """
+        Validate a batch of transaction rows, collecting errors instead of raising.
+        
+        Args:
+            rows: Iterable of (row_number, transaction data dict) pairs
+            
+        Returns:
+            tuple: (list of validated data dicts, list of "Row N: ..." error messages)
+        """
+        validate = InputValidator.validate_transaction_data
+        valid_rows = []
+        errors = []
+        
+        for row_num, data in rows:
+            try:
+                valid_rows.append(validate(data))
+            except ValidationError as e:
+                errors.append(f"Row {row_num}: {str(e)}")
+            except ValueError:
+                errors.append(f"Row {row_num}: Invalid date or amount format")
+            except Exception as e:
+                errors.append(f"Row {row_num}: {str(e)}")
+        
+        return valid_rows, errors
+    
+    @staticmethod
+    def validate_registration(form) -> dict:
+        """
+        Validate a registration form in one pass (no database access).
+        
+        Args:
+            form: Mapping with email, first_name, last_name, password and confirm_password
+            
+        Returns:
+            dict: Normalized email, first_name, last_name and password
+            
+        Raises:
+            ValidationError: With the message for the first failing check
+        """
+        email = form.get('email', '').strip().lower()
+        first_name = form.get('first_name', '').strip()
+        last_name = form.get('last_name', '').strip()
+        password = form.get('password', '')
+        confirm_password = form.get('confirm_password', '')
+        
+        if not (email and first_name and last_name and password and confirm_password):
+            error = 'All fields are required'
+        elif not InputValidator.EMAIL_PATTERN.match(email):
+            error = 'Please enter a valid email address'
+        elif len(password) < InputValidator.MIN_PASSWORD_LENGTH:
+            error = f'Password must be at least {InputValidator.MIN_PASSWORD_LENGTH} characters long'
+        elif password != confirm_password:
+            error = 'Passwords do not match'
+        elif len(first_name) < InputValidator.MIN_NAME_LENGTH or len(last_name) < InputValidator.MIN_NAME_LENGTH:
+            error = f'First and last names must be at least {InputValidator.MIN_NAME_LENGTH} characters long'
+        else:
+            return {
+                'email': email,
+                'first_name': first_name.title(),
+                'last_name': last_name.title(),
+                'password': password
+            }
+        raise ValidationError(error)
+    
     @staticmethod
     def validate_file_upload(file, allowed_extensions: set, max_size_mb: int = 16) -> Tuple[bool, str]:
         """
@@ -340,6 +424,13 @@ class SearchValidator:
     
     MAX_SEARCH_LENGTH = 200
     
+    # Rejected search content, compiled once into a single scan
+    DANGEROUS_QUERY_PATTERN = re.compile(
+        r'union\s+select|drop\s+table|delete\s+from|insert\s+into|update\s+.+set'
+        r'|exec\s*\(|<script[^>]*>|javascript:',
+        re.IGNORECASE
+    )
+    
     @staticmethod
     def validate_search_query(query: Optional[str]) -> Optional[str]:
         """
@@ -369,20 +460,8 @@ class SearchValidator:
             raise ValidationError(f"Search query cannot exceed {SearchValidator.MAX_SEARCH_LENGTH} characters")
         
         # Basic SQL injection prevention
-        dangerous_patterns = [
-            r'union\s+select',
-            r'drop\s+table',
-            r'delete\s+from',
-            r'insert\s+into',
-            r'update\s+.+set',
-            r'exec\s*\(',
-            r'<script[^>]*>',
-            r'javascript:'
-        ]
-        
-        for pattern in dangerous_patterns:
-            if re.search(pattern, query, re.IGNORECASE):
-                raise ValidationError("Search query contains invalid content")
+        if SearchValidator.DANGEROUS_QUERY_PATTERN.search(query):
+            raise ValidationError("Search query contains invalid content")
         
         return query
     